@@ -1,6 +1,7 @@
 include $(top_srcdir)/include.mk
 
-dist_extension_DATA = extension.js webappmenu-setup.py
+dist_extension_DATA = extension.js webappScheduler.js webappScan.js \
+	webappmenu-setup.py webappmenu-readahead.py
 nodist_extension_DATA = metadata.json settings.json
 
 metadata.json: metadata.json.in $(top_builddir)/config.status
@@ -24,6 +24,7 @@ const Gio       = imports.gi.Gio;
 const GLib      = imports.gi.GLib;
 const Lang      = imports.lang;
 const Main      = imports.ui.main;
+const Mainloop  = imports.mainloop;
 const PanelMenu = imports.ui.panelMenu;
 const PopupMenu = imports.ui.popupMenu;
 const Shell     = imports.gi.Shell;
@@ -32,20 +33,39 @@ const St        = imports.gi.St;
 /* from epiphany (which took it from libgnome in its turn) */
 const GNOME_DOT_GNOME       = '.gnome2';
 const APP_NAME              = 'epiphany';
-const APP_PREFIX            = 'app-';
-const DIR_PREFIX            = APP_PREFIX + APP_NAME + '-';
 const ENTRY_EXT             = '.desktop';
-const GNOME_ENV             = 'GNOME';
 const LOCALE_SUBDIR         = 'locale';
 const LOCALE_EXT            = '.mo';
 const MSG_SUBDIR            = 'LC_MESSAGES';
 const SETTINGS_FILENAME     = 'settings.json';
+const SYSTEM_SETTINGS_PATH  = '/etc/web-application-menu/settings.json';
+const SYSTEM_INDEX_PATH     = '/var/cache/web-application-menu/index.json';
 const SETUP                 = 'webappmenu-setup.py';
+const READAHEAD             = 'webappmenu-readahead.py';
+const CACHE_SUBDIR          = 'web-application-menu';
+const LAUNCH_HISTORY_NAME   = 'launches.json';
+const SCHEDULER_MODULE      = 'webappScheduler';
+const SCAN_MODULE           = 'webappScan';
+const XDG_APP_SUBDIR        = 'applications';
 const EXT_STATUS_AREA_ID    = 'webapps';
 const MENU_ALIGNMENT        = 0.5;
 const XDG_APP_DIR_PERMS     = 750;
 const FIELD_SIZE            = 1;
 const NEW_API_VERSION       = [ 3, 3, 0 ];
+const ITEM_SIGNALS          = 2;
+const DEBUG_COUNTERS        = false;
+const USEC_PER_MSEC         = 1000;
+const USEC_PER_SEC          = 1000000;
+const LAUNCH_TIMEOUT        = 60;
+const PREWARM_INTERVAL      = 300;
+const LAUNCH_SAVE_DELAY     = 30;
+const CACHE_DIR_PERMS       = 0x1c0; /* 0700 */
+const PROBE_INTERVAL        = 60;
+const PROBE_TIMEOUT         = 5;
+const PROBE_MAX_INTERVAL    = 3600;
+const SCAN_TIMEOUT          = 30;
+const MAX_SHARDS            = 26;
+const SHARD_LABEL_LENGTH    = 1;
 
 /* default values */
 const DEFAULT_ICON_SIZE                     = 16;
@@ -53,22 +73,40 @@ const DEFAULT_SHOW_ICONS                    = true;
 const DEFAULT_USE_DEFAULT_PROFILE           = true;
 const DEFAULT_SPLIT_PROFILE_VIEW            = true;
 const DEFAULT_HIDE_ENTRIES_NOT_IN_XDG_DIR   = true;
+const DEFAULT_PREWARM_COUNT                 = 0;
+const DEFAULT_SHARD_THRESHOLD               = 50;
 
 /* text */
-const BROWSE_TEXT       = "Browse your Web Applications"
-const CONFIGURE_TEXT    = "Advanced settings";
+const BROWSE_TEXT           = "Browse your Web Applications"
+const CONFIGURE_TEXT        = "Advanced settings";
+const SHARD_TEXT            = "%s \u2013 %s";
+const SHARD_PROFILE_TEXT    = "%s: %s";
 
 /* warning messages */
 const WARNING_CHANGED_FILE      = "Configuration file changed!!!";
+const WARNING_RECOVERED         = "Quarantined profile \"%s\" is back.";
 const WARNING_UNEXISTING_FILE   = "WARNING: file \"%s\" does not exist.";
 
+/* debug messages */
+const DEBUG_COUNTERS_TEXT   = "DEBUG: rebuild #%d done: %d live items, %d \
+connected signals, %d monitors.";
+const DEBUG_DISABLE_TEXT    = "DEBUG: disabled with %d live items, %d \
+connected signals, %d monitors.";
+const DEBUG_LAUNCH_TEXT     = "DEBUG: \"%s\" mapped after %d ms (%s), %d ms \
+on average over %d launches.";
+const DEBUG_COLD_TEXT       = "cold";
+const DEBUG_PREWARMED_TEXT  = "prewarmed";
+
 /* error messages */
+const ERROR_LAUNCH          = "ERROR: could not launch \"%s\".";
 const ERROR_MKDIR_FAILED    = "ERROR: could not make directory \"%s\".";
 const ERROR_MONITOR         = "ERROR: can't monitor configuration file.";
 const ERROR_NOT_A_DIRECTORY = "ERROR: \"%s\" is not a directory.";
+const ERROR_SCAN_TIMEOUT    = "ERROR: gave up reading profile \"%s\".";
 const ERROR_SPAWN           = "ERROR: could not run \"%s\"";
 const ERROR_UNPARSABLE_FILE = "ERROR: could not parse \"%s\".";
 const ERROR_UNREADABLE_FILE = "ERROR: could not read contents for file \"%s\".";
+const ERROR_WRITE_FILE      = "ERROR: could not write file \"%s\".";
 
 /* divide and conquer search function for menu item insertion in
  * alphabetical order, with submenus at the top */
@@ -106,16 +144,17 @@ function ab_insert(entry, split) {
         }
     }
 
-    /* case insensitive sorting */
-    let cmp_text = entry.label.text.toLowerCase();
+    /* locale aware, case insensitive sorting, on keys computed once per
+     * entry */
+    let cmp_text = entry.sort_key;
 
-    if (cmp_text < children[start].label.text.toLowerCase()) {
+    if (Scan.compare_sort_keys(cmp_text, children[start].sort_key) < 0) {
         (is_submenu)?this._submenus++:this._entries++;
         this.addMenuItem(entry, start);
         return;
     }
 
-    if (cmp_text > children[end].label.text.toLowerCase()) {
+    if (Scan.compare_sort_keys(cmp_text, children[end].sort_key) > 0) {
         (is_submenu)?this._submenus++:this._entries++;
         this.addMenuItem(entry, end + 1);
         return;
@@ -126,7 +165,7 @@ function ab_insert(entry, split) {
         /* fetch the entry in the middle */
         mid = Math.floor((start + end) / 2);
 
-        if (cmp_text < children[mid].label.text.toLowerCase()) {
+        if (Scan.compare_sort_keys(cmp_text, children[mid].sort_key) < 0) {
             end = mid;
         } else {
             start = mid;
@@ -135,7 +174,7 @@ function ab_insert(entry, split) {
 
     /* at this point we have a subarray containing 2 elements */
     mid = start;
-    if (cmp_text > children[mid].label.text.toLowerCase()) {
+    if (Scan.compare_sort_keys(cmp_text, children[mid].sort_key) > 0) {
         mid++;
     }
     (is_submenu)?this._submenus++:this._entries++;
@@ -145,35 +184,338 @@ function ab_insert(entry, split) {
 /* slip the insertion function into these classes */
 PopupMenu.PopupMenu.prototype.ab_insert = ab_insert;
 PopupMenu.PopupSubMenu.prototype.ab_insert = ab_insert;
+PopupMenu.PopupMenuSection.prototype.ab_insert = ab_insert;
+
+/* parse a JSON file, returning undefined if it's missing or broken */
+function read_json_file(file) {
+    let ret;
+    let data;
+
+    if (!(file.query_exists(null))) {
+        return undefined;
+    }
+
+    /* errors such as a lack of permissions are thrown rather than
+     * returned */
+    try {
+        [ ret, data ] = file.load_contents(null);
+    } catch (e) {
+        ret = false;
+    }
+
+    if (!ret) {
+        global.log(_(ERROR_UNREADABLE_FILE).format(file.get_path()));
+        return undefined;
+    }
+
+    try {
+        return JSON.parse(data);
+    } catch(e) {
+        global.log(_(ERROR_UNPARSABLE_FILE).format(file.get_path()));
+    }
+    return undefined;
+}
+
+function is_valid_profile(profile) {
+    return ((profile != undefined) && (profile['name'] != undefined) &&
+            (profile['name'].constructor == String) &&
+            (profile['directory'] != undefined) &&
+            (profile['directory'].constructor == String));
+}
+
+/* profiles on dead or hung mounts get quarantined by the setup tool */
+function is_quarantined(profile) {
+    return ((profile['quarantined'] != undefined) &&
+            (profile['quarantined'].constructor == Boolean) &&
+            (profile['quarantined']));
+}
+
+/* debug counters, useful to make sure that nothing is leaked across
+ * rebuilds in long running sessions */
+let live_items = 0;
+let live_signals = 0;
+let live_monitors = 0;
+
+function connect_counted(obj, signal, callback) {
+    live_signals++;
+    return obj.connect(signal, callback);
+}
+
+function disconnect_counted(obj, id) {
+    live_signals--;
+    obj.disconnect(id);
+}
+
+/* handlers shared among all the menu items, so that no closure needs to be
+ * built for each of them */
+function on_item_destroy(item) {
+    live_items--;
+    live_signals -= ITEM_SIGNALS;
+}
+
+function on_tracked_destroy(item) {
+    live_items--;
+    live_signals--;
+}
+
+/* count a submenu or a section, which has no handlers of its own, among the
+ * live items until it gets destroyed */
+function track_item(item) {
+    live_items++;
+    live_signals++;
+    item.connect('destroy', on_tracked_destroy);
+    return item;
+}
+
+/* launch statistics: the number of launches for each desktop file, when it
+ * was last read ahead and the latency between the click and the mapping of
+ * the window, split by prewarmed and cold launches. Counts and latencies are
+ * kept across sessions in the user's cache directory, so that the
+ * applications worth reading ahead are known right after login, and the
+ * setup tool can report about them */
+let launch_counts = {};
+let prewarmed_at = {};
+let launch_stats = null;
+let save_id = 0;
+
+function reset_launch_state() {
+    launch_counts = {};
+    prewarmed_at = {};
+    launch_stats = {
+        'cold': { 'count': 0, 'total': 0 },
+        'prewarmed': { 'count': 0, 'total': 0 }
+    };
+}
+
+reset_launch_state();
+
+function is_number(value) {
+    return ((value != undefined) && (value.constructor == Number));
+}
+
+function get_launch_history_path() {
+    return GLib.build_filenamev([ GLib.get_user_cache_dir(), CACHE_SUBDIR,
+            LAUNCH_HISTORY_NAME ]);
+}
+
+function load_launch_history() {
+    let history = read_json_file(Gio.file_new_for_path(
+            get_launch_history_path()));
+
+    if ((history == undefined) || (history['counts'] == undefined) ||
+            (history['counts'].constructor != Object)) {
+        return;
+    }
+
+    launch_counts = {};
+    for (let path in history['counts']) {
+        if (is_number(history['counts'][path])) {
+            launch_counts[path] = history['counts'][path];
+        }
+    }
+
+    if ((history['stats'] == undefined) ||
+            (history['stats'].constructor != Object)) {
+        return;
+    }
+
+    for (let kind in launch_stats) {
+        let stats = history['stats'][kind];
+
+        if ((stats != undefined) && (is_number(stats['count'])) &&
+                (is_number(stats['total']))) {
+            launch_stats[kind] = {
+                'count': stats['count'],
+                'total': stats['total']
+            };
+        }
+    }
+}
+
+function save_launch_history() {
+    let path = get_launch_history_path();
+    let dir = GLib.path_get_dirname(path);
+
+    if (save_id) {
+        Mainloop.source_remove(save_id);
+        save_id = 0;
+    }
+
+    if (GLib.mkdir_with_parents(dir, CACHE_DIR_PERMS)) {
+        global.log(_(ERROR_MKDIR_FAILED).format(dir));
+        return;
+    }
+
+    try {
+        GLib.file_set_contents(path, JSON.stringify({
+            'counts': launch_counts,
+            'stats': launch_stats
+        }));
+    } catch (e) {
+        global.log(_(ERROR_WRITE_FILE).format(path));
+    }
+}
+
+/* write the history down a while after it changes, so that a burst of
+ * launches only costs a single write */
+function queue_launch_history_save() {
+    if (save_id) {
+        return;
+    }
+
+    save_id = Mainloop.timeout_add_seconds(LAUNCH_SAVE_DELAY, function() {
+        save_id = 0;
+        save_launch_history();
+        return false;
+    });
+}
+
+/* launches still waiting for their window, indexed by wm_class */
+let pending_launches = {};
+let map_id = 0;
+
+function is_prewarmed(entry_path) {
+    return ((prewarmed_at[entry_path] != undefined) &&
+            (GLib.get_monotonic_time() - prewarmed_at[entry_path] <
+            PREWARM_INTERVAL * USEC_PER_SEC));
+}
+
+/* the most launched entries which haven't been read ahead lately */
+function get_prewarm_candidates(count) {
+    let paths = [];
+
+    for (let path in launch_counts) {
+        if ((Scan.get_cached_entry(path) != undefined) &&
+                (!is_prewarmed(path))) {
+            paths.push(path);
+        }
+    }
+
+    paths.sort(function(a, b) {
+        return launch_counts[b] - launch_counts[a];
+    });
+    return paths.slice(0, count);
+}
+
+function on_window_mapped(shellwm, actor) {
+    let wm_class = actor.meta_window.get_wm_class();
+    let launch;
+    let elapsed;
+    let stats;
+
+    if (!wm_class) {
+        return;
+    }
+
+    launch = pending_launches[wm_class.toLowerCase()];
+    if (launch == undefined) {
+        return;
+    }
+
+    elapsed = (GLib.get_monotonic_time() - launch['start']) / USEC_PER_MSEC;
+    stats = launch_stats[(launch['prewarmed'])?'prewarmed':'cold'];
+    stats['count']++;
+    stats['total'] += elapsed;
+    queue_launch_history_save();
+    if (DEBUG_COUNTERS) {
+        global.log(_(DEBUG_LAUNCH_TEXT).format(wm_class, elapsed,
+                _((launch['prewarmed'])?DEBUG_PREWARMED_TEXT:DEBUG_COLD_TEXT),
+                stats['total'] / stats['count'], stats['count']));
+    }
+
+    end_launch_tracking(wm_class.toLowerCase());
+}
+
+/* wait for the window of a launched application. The map signal is only
+ * connected while there's something to wait for */
+function start_launch_tracking(entry_path) {
+    let wm_class = GLib.path_get_basename(entry_path);
+
+    wm_class = wm_class.substring(0, wm_class.length -
+            ENTRY_EXT.length).toLowerCase();
+    end_launch_tracking(wm_class);
+
+    pending_launches[wm_class] = {
+        'start': GLib.get_monotonic_time(),
+        'prewarmed': is_prewarmed(entry_path),
+        'timeout_id': Mainloop.timeout_add_seconds(LAUNCH_TIMEOUT,
+                function() {
+                    pending_launches[wm_class]['timeout_id'] = 0;
+                    end_launch_tracking(wm_class);
+                    return false;
+                })
+    };
+
+    if (!map_id) {
+        map_id = connect_counted(global.window_manager, 'map',
+                on_window_mapped);
+    }
+}
+
+function end_launch_tracking(wm_class) {
+    let launch = pending_launches[wm_class];
+
+    if (launch == undefined) {
+        return;
+    }
+
+    if (launch['timeout_id']) {
+        Mainloop.source_remove(launch['timeout_id']);
+    }
+    delete pending_launches[wm_class];
+
+    if ((map_id) && (!(Object.keys(pending_launches).length))) {
+        disconnect_counted(global.window_manager, map_id);
+        map_id = 0;
+    }
+}
+
+function on_webapp_activate(item) {
+    let app = Gio.DesktopAppInfo.new_from_filename(item.entry_path);
+
+    if (!app) {
+        global.log(_(ERROR_LAUNCH).format(item.entry_path));
+        return;
+    }
+
+    launch_counts[item.entry_path] = (launch_counts[item.entry_path] ||
+            0) + 1;
+    queue_launch_history_save();
+    start_launch_tracking(item.entry_path);
+    app.launch([], global.create_app_launch_context());
+}
 
 function WebAppMenuItem() {
     this._init.apply(this, arguments);
 }
 
-/* define the web app menu item class */
+/* define the web app menu item class. Only the path of the desktop file is
+ * kept: the application info gets loaded again when it has to be launched */
 WebAppMenuItem.prototype = {
     __proto__: PopupMenu.PopupBaseMenuItem.prototype,
 
-    _init: function(app, show_icons, icon_size, params) {
+    _init: function(entry_path, entry, show_icons, icon_size, params) {
         PopupMenu.PopupBaseMenuItem.prototype._init.call(this, params);
 
-        this.app = app;
+        this.entry_path = entry_path;
+        this.sort_key = entry['sort_key'];
         this.box = new St.BoxLayout({ style_class: 'popup-combobox-item' });
         if (show_icons) {
             this.icon = St.TextureCache.get_default().load_gicon(null,
-                    app.get_icon(), icon_size);
+                    entry['gicon'], icon_size);
             this.box.add(this.icon, {expand: true, x_fill: false,
                     y_fill: false, x_align: St.Align.END,
                     y_align: St.Align.MIDDLE });
         }
-        this.label = new St.Label({ text: app.get_name() });
+        this.label = new St.Label({ text: entry['name'] });
         this.box.add(this.label, {expand: true, x_fill: false, y_fill: false,
                 x_align: St.Align.START, y_align: St.Align.MIDDLE });
         this.addActor(this.box);
 
-        this.connect('activate', Lang.bind(this, function() {
-            this.app.launch([], global.create_app_launch_context())
-        }));
+        live_items++;
+        live_signals += ITEM_SIGNALS;
+        this.connect('activate', on_webapp_activate);
+        this.connect('destroy', on_item_destroy);
     }
 };
 
@@ -182,34 +524,87 @@ function ConfiguratorItem() {
 }
 
 /* define a new class for the configurator entry to easily detect its presence
- * later */
+ * later. It's built once and just updated when the settings change */
 ConfiguratorItem.prototype = {
     __proto__: PopupMenu.PopupBaseMenuItem.prototype,
 
     _init: function(text, show_icons, icon_size, command, params) {
         PopupMenu.PopupBaseMenuItem.prototype._init.call(this, params);
 
+        this.command = command;
         this.box = new St.BoxLayout({ style_class: 'popup-combobox-item' });
-        if (show_icons) {
-            this.icon = new St.Icon({
-                icon_name: 'preferences-system',
-                icon_type: St.IconType.FULLCOLOR,
-                icon_size: icon_size
-            });
-            this.box.add(this.icon, {expand: true, x_fill: false,
-                    y_fill: false, x_align: St.Align.END,
-                    y_align: St.Align.MIDDLE });
-        }
+        this.icon = new St.Icon({
+            icon_name: 'preferences-system',
+            icon_type: St.IconType.FULLCOLOR,
+            icon_size: icon_size
+        });
+        this.box.add(this.icon, {expand: true, x_fill: false,
+                y_fill: false, x_align: St.Align.END,
+                y_align: St.Align.MIDDLE });
         this.label = new St.Label({ text: text });
         this.box.add(this.label, {expand: true, x_fill: false, y_fill: false,
                 x_align: St.Align.START, y_align: St.Align.MIDDLE });
         this.addActor(this.box);
+        this.set_icon_params(show_icons, icon_size);
 
+        live_items++;
+        live_signals += ITEM_SIGNALS;
         this.connect('activate', Lang.bind(this, function() {
-            if (!GLib.spawn_command_line_async(command, null)) {
-                global.log(_(ERROR_SPAWN).format(command));
+            if (!GLib.spawn_command_line_async(this.command, null)) {
+                global.log(_(ERROR_SPAWN).format(this.command));
             }
         }));
+        this.connect('destroy', on_item_destroy);
+    },
+
+    set_icon_params: function(show_icons, icon_size) {
+        this.icon.icon_size = icon_size;
+        if (show_icons) {
+            this.icon.show();
+        } else {
+            this.icon.hide();
+        }
+    }
+};
+
+function ShardMenuItem() {
+    this._init.apply(this, arguments);
+}
+
+/* a submenu holding a range of the entries of a large profile. Its items are
+ * only built the first time it gets opened */
+ShardMenuItem.prototype = {
+    __proto__: PopupMenu.PopupSubMenuMenuItem.prototype,
+
+    _init: function(text, records, show_icons, icon_size) {
+        let open;
+
+        PopupMenu.PopupSubMenuMenuItem.prototype._init.call(this, text);
+
+        this.sort_key = Scan.get_sort_key(text);
+        track_item(this);
+        this.records = records;
+        this.show_icons = show_icons;
+        this.icon_size = icon_size;
+
+        /* an empty submenu refuses to open, so fill it in right before */
+        open = this.menu.open;
+        this.menu.open = Lang.bind(this, function(animate) {
+            this._populate();
+            open.call(this.menu, animate);
+        });
+    },
+
+    _populate: function() {
+        if (this.records == null) {
+            return;
+        }
+
+        for each (let record in this.records) {
+            this.menu.addMenuItem(new WebAppMenuItem(record[0], record[1],
+                    this.show_icons, this.icon_size, {}));
+        }
+        this.records = null;
     }
 };
 
@@ -233,51 +628,132 @@ WebAppExtension.prototype = {
                 SETTINGS_FILENAME]);
         this.config_file = Gio.file_new_for_path(this.config_file_path);
         this._setup_values();
+        this._setup_system_values();
+        load_launch_history();
+        this._options_dirty = false;
+        this._system_dirty = false;
+        this._recovered = {};
+        this._probe_id = 0;
+        this._probes = {};
+        this._probe_backoff = {};
+
+        /* rebuilds are serialized by the scheduler, which also drops
+         * whatever is left of an older one */
+        this._scheduler = new Scheduler.RebuildScheduler(Mainloop,
+                Lang.bind(this, this._start_redisplay));
+
         this.monitor = this.config_file.monitor_file(
                 Gio.FileMonitorFlags.NONE, null, null);
         if (!this.monitor) {
             global.log(_(ERROR_MONITOR));
         } else {
-            this.monitor.connect('changed', Lang.bind(this,
+            live_monitors++;
+            this.monitor_id = connect_counted(this.monitor, 'changed',
+                    Lang.bind(this,
                 function(monitor, file, other_file, event_type, data) {
                     global.log(_(WARNING_CHANGED_FILE));
-                    this._setup_values();
-                    this._redisplay(); 
+                    /* a single save may emit many events: read the file
+                     * just once, right before rebuilding */
+                    this._options_dirty = true;
+                    this._queue_redisplay();
                 }));
         }
 
+        /* the system profiles and their index are edited by the
+         * administrator */
+        this.system_monitors = [];
+        for each (let path in [ SYSTEM_SETTINGS_PATH, SYSTEM_INDEX_PATH ]) {
+            let monitor = Gio.file_new_for_path(path).monitor_file(
+                    Gio.FileMonitorFlags.NONE, null, null);
+
+            if (!monitor) {
+                continue;
+            }
+            live_monitors++;
+            this.system_monitors.push({ 'monitor': monitor,
+                    'id': connect_counted(monitor, 'changed', Lang.bind(this,
+                    function() {
+                        this._system_dirty = true;
+                        this._queue_redisplay();
+                    })) });
+        }
+
         this._icon = new St.Icon({ icon_name: 'non-starred',
                                    icon_type: St.IconType.SYMBOLIC,
                                    style_class: 'system-status-icon' });
         this.actor.add_actor(this._icon);
 
+        /* only the entries section gets rebuilt, the items below it are
+         * kept for the whole lifetime of the extension */
+        this._entries = track_item(new PopupMenu.PopupMenuSection());
+        this.menu.addMenuItem(this._entries);
+        this._separator = new PopupMenu.PopupSeparatorMenuItem();
+        this._separator.actor.hide();
+        this.menu.addMenuItem(this._separator);
+        this._configurator = new ConfiguratorItem(_(CONFIGURE_TEXT),
+                this.options['show-icons'], this.options['icon-size'],
+                'python ' + GLib.build_filenamev([ this.path, SETUP ]) +
+                ' -f ' + this.config_file_path);
+        this.menu.addMenuItem(this._configurator);
+
         this._appSystem = Shell.AppSystem.get_default();
-        this._display();
+        this._queue_redisplay();
 
-        this.sigcon = this._appSystem.connect('installed-changed',
-                Lang.bind(this, this._redisplay));
+        this.sigcon = connect_counted(this._appSystem, 'installed-changed',
+                Lang.bind(this, this._queue_redisplay));
 
         Main.panel.addToStatusArea(EXT_STATUS_AREA_ID, this);
         this.set_tooltip(_(BROWSE_TEXT));
-        this.menu.connect('open-state-changed', Lang.bind(this,
-                this._on_open_state_changed));
+        this.open_id = connect_counted(this.menu, 'open-state-changed',
+                Lang.bind(this, this._on_open_state_changed));
     },
 
     _on_open_state_changed: function() {
+        if ((this.menu.isOpen) && (this.options['prewarm-count'] > 0)) {
+            this._prewarm(this.options['prewarm-count']);
+        }
+
         /* if all the root menu contains is just a submenu, unroll it */
         if ((this.menu.isOpen) && (this.options['split-profile-view'])) {
-            let children = this.menu._getMenuItems();
+            let children = this._entries._getMenuItems();
 
-            if ((children.length == 3) && (children[0] instanceof
-                    PopupMenu.PopupSubMenuMenuItem) && (children[1] instanceof
-                    PopupMenu.PopupSeparatorMenuItem) && (children[2]
-                    instanceof ConfiguratorItem)) {
+            if ((children.length == 1) && (children[0] instanceof
+                    PopupMenu.PopupSubMenuMenuItem)) {
                 children[0].menu.open(true);
                 children[0].setSensitive(false);
             }
         }
     },
 
+    /* ask the read-ahead helper to preload the profile files and the icons
+     * of the most used applications, so that launching them won't hit a
+     * cold disk */
+    _prewarm: function(count) {
+        let paths = [];
+        let now = GLib.get_monotonic_time();
+        let command;
+
+        for each (let entry_path in get_prewarm_candidates(count)) {
+            let gicon = Scan.get_cached_entry(entry_path)['gicon'];
+
+            paths.push(GLib.shell_quote(GLib.path_get_dirname(entry_path)));
+            if (gicon instanceof Gio.FileIcon) {
+                paths.push(GLib.shell_quote(gicon.get_file().get_path()));
+            }
+            prewarmed_at[entry_path] = now;
+        }
+
+        if (!(paths.length)) {
+            return;
+        }
+
+        command = 'python ' + GLib.build_filenamev([ this.path,
+                READAHEAD ]) + ' ' + paths.join(' ');
+        if (!GLib.spawn_command_line_async(command, null)) {
+            global.log(_(ERROR_SPAWN).format(command));
+        }
+    },
+
     set_tooltip: function(text) {
         if (text != null) {
             this.tooltip = text;
@@ -290,28 +766,14 @@ WebAppExtension.prototype = {
     },
 
     _setup_values: function() {
-        let ret;
-        let data;
         let i = 0;
 
-        this.options = undefined;
-
         /* store settings in a JSON file until users can install gsettings
          * keys */
         if (!(this.config_file.query_exists(null))) {
             global.log(_(WARNING_UNEXISTING_FILE).format(this.path));
-        } else {
-            [ ret, data ] = this.config_file.load_contents(null);
-            if (!ret) {
-                global.log(_(ERROR_UNREADABLE_FILE).format(this.path));
-            } else {
-                try {
-                    this.options = JSON.parse(data);
-                } catch(e) {
-                    global.log(_(ERROR_UNPARSABLE_FILE).format(this.path));
-                }
-            }
         }
+        this.options = read_json_file(this.config_file);
 
         /* at this point we can't know how parsing went... */
         if (this.options == undefined) {
@@ -320,6 +782,8 @@ WebAppExtension.prototype = {
                 'split-profile-view': DEFAULT_SPLIT_PROFILE_VIEW,
                 'show-icons': DEFAULT_SHOW_ICONS,
                 'icon-size': DEFAULT_ICON_SIZE,
+                'prewarm-count': DEFAULT_PREWARM_COUNT,
+                'shard-threshold': DEFAULT_SHARD_THRESHOLD,
                 'profiles': []
             };
         }
@@ -353,6 +817,16 @@ WebAppExtension.prototype = {
             this.options['icon-size'] = DEFAULT_ICON_SIZE;
         }
 
+        if ((this.options['prewarm-count'] == undefined) ||
+                (this.options['prewarm-count'].constructor != Number)) {
+            this.options['prewarm-count'] = DEFAULT_PREWARM_COUNT;
+        }
+
+        if ((this.options['shard-threshold'] == undefined) ||
+                (this.options['shard-threshold'].constructor != Number)) {
+            this.options['shard-threshold'] = DEFAULT_SHARD_THRESHOLD;
+        }
+
         if ((this.options['profiles'] == undefined) ||
                 (this.options['profiles'].constructor != Array)) {
             this.options['profiles'] = [];
@@ -360,12 +834,7 @@ WebAppExtension.prototype = {
 
         /* destroy the invalid array entries */
         while (i < this.options['profiles'].length) {
-            if ((this.options['profiles'][i]['name'] == undefined) ||
-                    (this.options['profiles'][i]['name'].constructor
-                    != String) ||
-                    (this.options['profiles'][i]['directory'] == undefined) ||
-                    (this.options['profiles'][i]['directory'].constructor
-                    != String)) {
+            if (!(is_valid_profile(this.options['profiles'][i]))) {
                 this.options['profiles'].splice(i, FIELD_SIZE);
             } else {
                 i++;
@@ -373,144 +842,488 @@ WebAppExtension.prototype = {
         }
     },
 
-    _display: function() {
-        /* handle the default profile */
-        if ((this.options['use-default-profile'] != undefined) &&
-                (this.options['use-default-profile'])) {
-            this._build_entries_for_profile_dir(this.menu,
-                    GLib.build_filenamev([ GLib.get_home_dir(),
-                    GNOME_DOT_GNOME, APP_NAME ]));
+    /* read the profiles shared by all the users, along with the index the
+     * administrator has built for them */
+    _setup_system_values: function() {
+        let settings = read_json_file(Gio.file_new_for_path(
+                SYSTEM_SETTINGS_PATH));
+        let index = read_json_file(Gio.file_new_for_path(SYSTEM_INDEX_PATH));
+
+        this.system_profiles = [];
+        this.system_index = {};
+
+        if ((settings != undefined) && (settings['profiles'] != undefined) &&
+                (settings['profiles'].constructor == Array)) {
+            for each (let profile in settings['profiles']) {
+                if (is_valid_profile(profile)) {
+                    this.system_profiles.push(profile);
+                }
+            }
         }
 
-        for each (let profile in this.options['profiles']) {
-            if (this.options['split-profile-view']) {
-                let submenu = new PopupMenu.PopupSubMenuMenuItem(
-                        profile['name']);
-                this._build_entries_for_profile_dir(submenu.menu,
-                        profile['directory']);
-                if (submenu.menu._getMenuItems().length) {
-                    this.menu.ab_insert(submenu, true);
+        if ((index != undefined) && (index['profiles'] != undefined) &&
+                (index['profiles'].constructor == Array)) {
+            for each (let profile in index['profiles']) {
+                if ((is_valid_profile(profile)) &&
+                        (profile['mtime'] != undefined) &&
+                        (profile['mtime'].constructor == Number) &&
+                        (profile['entries'] != undefined) &&
+                        (profile['entries'].constructor == Array) &&
+                        (profile['entries'].every(Scan.is_valid_index_entry))) {
+                    this.system_index[profile['directory']] = profile;
                 }
-            } else {
-                this._build_entries_for_profile_dir(this.menu,
-                        profile['directory']);
-
             }
         }
+    },
+
+    /* schedule a rebuild of the menu. A burst of triggers only costs a
+     * single scan */
+    _queue_redisplay: function() {
+        this._scheduler.queue();
+    },
 
-        /* no separator if there are no entries */
-        if (this.menu._getMenuItems().length) {
-            this.menu.addMenuItem(new PopupMenu.PopupSeparatorMenuItem());
+    /* set up a new rebuild and return its tasks. Any rebuild still in
+     * progress has been cancelled by the scheduler already */
+    _start_redisplay: function(generation, cancellable) {
+        Scan.update_language_names();
+
+        if (this._options_dirty) {
+            this._options_dirty = false;
+            this._setup_values();
+            this._prune_recovered();
         }
 
-        /* add entry for setup app */
-        this.menu.addMenuItem(new ConfiguratorItem(_(CONFIGURE_TEXT),
-                this.options['show-icons'], this.options['icon-size'],
-                'python ' + GLib.build_filenamev([ this.path, SETUP ]) +
-                ' -f ' + this.config_file_path));
-    },
+        if (this._system_dirty) {
+            this._system_dirty = false;
+            this._setup_system_values();
+            this._prune_recovered();
+            Scan.clear_entry_cache();
+        }
 
-    _build_entries_for_profile_dir: function(submenu, config_path) {
-        let path = Gio.file_new_for_path(config_path);
-        let enumerator = null;
-        let info = null;
+        this._update_probe();
+        this._configurator.set_icon_params(this.options['show-icons'],
+                this.options['icon-size']);
+        this.actor.show();
 
-        if (!(GLib.file_test(config_path, GLib.FileTest.IS_DIR))) {
-            global.log(_(ERROR_NOT_A_DIRECTORY).format(config_path));
-            return;
+        if (this.options['hide-entries-not-in-xdg-dir']) {
+            let xdg_dir = GLib.build_filenamev([ GLib.get_user_data_dir(),
+                    XDG_APP_SUBDIR ]);
+
+            if (GLib.mkdir_with_parents(xdg_dir, XDG_APP_DIR_PERMS)) {
+                global.log(_(ERROR_MKDIR_FAILED).format(xdg_dir));
+            }
         }
 
-	    enumerator = path.enumerate_children(Gio.FILE_ATTRIBUTE_STANDARD_NAME,
-                Gio.FileQueryInfoFlags.NONE, null);
+        return this._build_tasks(generation);
+    },
 
-        while ((info = enumerator.next_file(null))) {
-            let element = info.get_name();
-            let full_path;
-            let entry_name;
-            let entry_path;
-            let app;
-            let menuitem;
+    /* split the menu construction in small tasks, run one slice at a time
+     * by the scheduler. The entries are put into a section of their own,
+     * which only replaces the one in the menu once it's complete: until
+     * then, the menu keeps showing the result of the last rebuild */
+    _build_tasks: function(generation) {
+        let tasks = [];
+        let user_dirs = {};
+        let default_dir = GLib.build_filenamev([ GLib.get_home_dir(),
+                GNOME_DOT_GNOME, APP_NAME ]);
+        let section = track_item(new PopupMenu.PopupMenuSection());
+
+        this._scheduler.add_cleanup(function() {
+            section.destroy();
+        });
 
-            /* check whether the file name begins by app-epiphany- */
-            if (!(GLib.str_has_prefix(element, DIR_PREFIX))) {
+        /* handle the default profile */
+        if ((this.options['use-default-profile'] != undefined) &&
+                (this.options['use-default-profile'])) {
+            user_dirs[default_dir] = true;
+            this._add_profile_tasks(tasks, section, generation, null,
+                    default_dir, null, true);
+        }
+
+        for each (let profile in this.options['profiles']) {
+            user_dirs[profile['directory']] = true;
+            if (this._skip_profile(profile)) {
                 continue;
             }
+            this._add_profile_tasks(tasks, section, generation,
+                    profile['name'], profile['directory'], null, true);
+        }
 
-            full_path = GLib.build_filenamev([ config_path, element ]);
-            /* check whether the file is a directory */
-            if (!(GLib.file_test(full_path, GLib.FileTest.IS_DIR))) {
+        /* system profiles come from the shared index whenever possible. The
+         * ones the user has configured on their own take precedence */
+        for each (let profile in this.system_profiles) {
+            if ((user_dirs[profile['directory']]) ||
+                    (this._skip_profile(profile))) {
                 continue;
             }
+            this._add_profile_tasks(tasks, section, generation,
+                    profile['name'], profile['directory'],
+                    this.system_index[profile['directory']], false);
+        }
 
-            /* try to build a valid entry for the desktop file
-             * the full path name for the entry file is:
-             *
-             * [PDIR]/app-epiphany-[NAME]-[DIG]/epiphany-[NAME]-[DIG].desktop
-             *
-             * where:
-             * PDIR is the profile directory;
-             * NAME is the desktop entry name (Name key);
-             * DIG is the wm_class-entry_name digest.
-             * */
-            entry_name = element.substring(APP_PREFIX.length) + ENTRY_EXT;
-            entry_path =  GLib.build_filenamev([ full_path, entry_name ]);
-            app = Gio.DesktopAppInfo.new_from_filename(entry_path);
-            if (!app) {
-                continue;
+        tasks.push(Lang.bind(this, function() {
+            this._entries.destroy();
+            this._entries = section;
+            this.menu.addMenuItem(section, 0);
+
+            /* no separator if there are no entries */
+            if (section._getMenuItems().length) {
+                this._separator.actor.show();
+            } else {
+                this._separator.actor.hide();
+            }
+            Scan.prune_entry_cache(generation);
+
+            if (DEBUG_COUNTERS) {
+                global.log(_(DEBUG_COUNTERS_TEXT).format(generation,
+                        live_items, live_signals, live_monitors));
+            }
+            return Scheduler.TASK_DONE;
+        }));
+
+        return tasks;
+    },
+
+    /* forget about the recovered profiles which aren't flagged anymore.
+     * The ones still flagged keep being shown, rather than waiting for the
+     * next probe */
+    _prune_recovered: function() {
+        let recovered = {};
+
+        for each (let profile in this.options['profiles'].concat(
+                this.system_profiles)) {
+            if ((is_quarantined(profile)) &&
+                    (this._recovered[profile['directory']])) {
+                recovered[profile['directory']] = true;
+            }
+        }
+        this._recovered = recovered;
+    },
+
+    _skip_profile: function(profile) {
+        return ((is_quarantined(profile)) &&
+                (!(this._recovered[profile['directory']])));
+    },
+
+    /* quarantined profiles are probed in the background, as long as there
+     * are any */
+    _update_probe: function() {
+        let needed = false;
+
+        for each (let profile in this.options['profiles'].concat(
+                this.system_profiles)) {
+            if (this._skip_profile(profile)) {
+                needed = true;
+                break;
             }
+        }
+
+        if ((needed) && (!this._probe_id)) {
+            this._probe_id = Mainloop.timeout_add_seconds(PROBE_INTERVAL,
+                    Lang.bind(this, this._probe_quarantined));
+        } else if ((!needed) && (this._probe_id)) {
+            Mainloop.source_remove(this._probe_id);
+            this._probe_id = 0;
+        }
+    },
 
-            /* ditch the entry if hidden or not visible in gnome */
-            if ((app.get_is_hidden()) || (!app.get_show_in(GNOME_ENV))) {
+    /* a directory still being probed is left alone, so that a hung mount
+     * doesn't pile up blocked threads, and one which keeps failing is
+     * probed less and less often */
+    _probe_quarantined: function() {
+        let now = GLib.get_monotonic_time();
+
+        for each (let profile in this.options['profiles'].concat(
+                this.system_profiles)) {
+            let directory = profile['directory'];
+            let backoff = this._probe_backoff[directory];
+
+            if ((!(this._skip_profile(profile))) ||
+                    (this._probes[directory] != undefined) ||
+                    ((backoff != undefined) && (now < backoff['due']))) {
                 continue;
             }
+            this._probe(directory);
+        }
+        return true;
+    },
 
-            if (this.options['hide-entries-not-in-xdg-dir']) {
-                let xdg_path = GLib.build_filenamev([GLib.get_user_data_dir(),
-                    'applications'])
-                let xdgfile_path = GLib.build_filenamev([xdg_path, entry_name])
-                let xdgfile = Gio.file_new_for_path(xdgfile_path);
-                let xdgfile_info;
+    /* query the directory asynchronously, so that a hung mount can't block
+     * the Shell, and give up after a while. The probe is only forgotten once
+     * its callback has run, even if it timed out */
+    _probe: function(directory) {
+        let cancellable = new Gio.Cancellable();
+        let probe = { 'cancellable': cancellable, 'timeout_id': 0 };
+
+        probe['timeout_id'] = Mainloop.timeout_add_seconds(PROBE_TIMEOUT,
+                function() {
+                    probe['timeout_id'] = 0;
+                    cancellable.cancel();
+                    return false;
+                });
+        this._probes[directory] = probe;
+
+        Gio.file_new_for_path(directory).query_info_async(
+                Gio.FILE_ATTRIBUTE_STANDARD_TYPE, Gio.FileQueryInfoFlags.NONE,
+                GLib.PRIORITY_LOW, cancellable, Lang.bind(this,
+                function(file, result) {
+                    let info = null;
+
+                    if (probe['timeout_id']) {
+                        Mainloop.source_remove(probe['timeout_id']);
+                        probe['timeout_id'] = 0;
+                    }
+                    if (this._probes[directory] == probe) {
+                        delete this._probes[directory];
+                    }
+
+                    try {
+                        info = file.query_info_finish(result);
+                    } catch (e) {
+                        info = null;
+                    }
+
+                    if ((info == null) ||
+                            (info.get_file_type() != Gio.FileType.DIRECTORY)) {
+                        this._back_off_probe(directory);
+                        return;
+                    }
+
+                    delete this._probe_backoff[directory];
+                    global.log(_(WARNING_RECOVERED).format(directory));
+                    this._recovered[directory] = true;
+                    this._queue_redisplay();
+                }));
+    },
 
-                if (GLib.mkdir_with_parents(xdg_path, XDG_APP_DIR_PERMS)) {
-                    global.log(_(ERROR_MKDIR_FAILED).format(xdg_path));
-                    continue;
-                }
+    /* double the time before the next probe of a directory, up to a limit */
+    _back_off_probe: function(directory) {
+        let backoff = this._probe_backoff[directory];
+        let interval = ((backoff != undefined)?backoff['interval']:
+                PROBE_INTERVAL);
 
-                if (!(GLib.file_test(xdgfile_path,
-                        GLib.FileTest.IS_SYMLINK))) {
-                    continue;
-                }
+        interval = Math.min(interval * 2, PROBE_MAX_INTERVAL);
 
-                xdgfile_info = xdgfile.query_info('*',
-                        Gio.FileQueryInfoFlags.NONE, null, null);
+        this._probe_backoff[directory] = {
+            'interval': interval,
+            'due': GLib.get_monotonic_time() + interval * USEC_PER_SEC
+        };
+    },
 
-                if (xdgfile_info == null) {
-                    continue;
-                }
+    /* add the tasks needed to fill a profile in, either by scanning its
+     * directory or by reading its index, if any. System profiles aren't
+     * linked into the user's application directory, so check_xdg is false
+     * for them. The default profile has no name and no submenu */
+    _add_profile_tasks: function(tasks, section, generation, name,
+            directory, indexed, check_xdg) {
+        let records = [];
+        let xdg_dir = null;
+
+        if ((check_xdg) && (this.options['hide-entries-not-in-xdg-dir'])) {
+            xdg_dir = GLib.build_filenamev([ GLib.get_user_data_dir(),
+                    XDG_APP_SUBDIR ]);
+        }
 
-                if (xdgfile_info.get_symlink_target() != entry_path) {
-                    continue;
+        tasks.push(this._async_task(generation, directory, records,
+                function(cancellable, done) {
+            let on_entry = function(entry_path, entry) {
+                records.push([ entry_path, entry ]);
+            };
+            let on_done = function(success) {
+                if (!success) {
+                    global.log(_(ERROR_NOT_A_DIRECTORY).format(directory));
                 }
+                done();
+            };
+
+            if (indexed != undefined) {
+                return Scan.read_index(directory, indexed, generation,
+                        cancellable, on_entry, on_done);
             }
+            return Scan.scan_directory(directory, xdg_dir, generation,
+                    cancellable, on_entry, on_done);
+        }));
 
-            /* insert the entry in alphabetical order */
-            menuitem = new WebAppMenuItem(app, this.options['show-icons'],
-                    this.options['icon-size'], {});
+        tasks.push(Lang.bind(this, function() {
+            this._place_records(section, name, records);
+            return Scheduler.TASK_DONE;
+        }));
+    },
 
-            submenu.ab_insert(menuitem, this.options['split-profile-view']);
+    /* put the entries found for a profile into the menu. Too many of them
+     * get split among alphabetical range submenus */
+    _place_records: function(section, name, records) {
+        let threshold = this.options['shard-threshold'];
+        let menu = section;
+        let submenu = null;
+
+        if (!(records.length)) {
+            return;
+        }
+
+        if ((threshold > 0) && (records.length > threshold)) {
+            this._place_shards(section, name, records, threshold);
+            return;
+        }
+
+        if ((name != null) && (this.options['split-profile-view'])) {
+            submenu = track_item(new PopupMenu.PopupSubMenuMenuItem(name));
+            submenu.sort_key = Scan.get_sort_key(name);
+            menu = submenu.menu;
+        }
+
+        for each (let record in records) {
+            this._insert_entry(menu, record[0], record[1]);
+        }
+
+        if (submenu != null) {
+            section.ab_insert(submenu, true);
         }
     },
 
-    _redisplay: function() {
-        this.menu.removeAll();
-        this.actor.show();
-        this._display();
+    /* shards are computed from the sorted entries, so that each of them
+     * covers a contiguous range. Entries are spread evenly, so that no shard
+     * is left with just a handful of them. The menu itself only gets
+     * MAX_SHARDS items at most, whatever the size of the profile, while each
+     * shard holds no more than threshold entries up to MAX_SHARDS times that
+     * many, and grows past that */
+    _place_shards: function(section, name, records, threshold) {
+        let count = Math.min(MAX_SHARDS, Math.ceil(records.length /
+                threshold));
+        let size = Math.floor(records.length / count);
+        let larger = records.length % count;
+        let start = 0;
+
+        records.sort(function(a, b) {
+            return Scan.compare_sort_keys(a[1]['sort_key'], b[1]['sort_key']);
+        });
+
+        for (let i = 0; i < count; i++) {
+            /* the first shards take one more entry each */
+            let end = start + size + ((i < larger)?1:0);
+            let shard = records.slice(start, end);
+            let first = shard[0][1]['name'].substring(0,
+                    SHARD_LABEL_LENGTH).toUpperCase();
+            let last = shard[shard.length - 1][1]['name'].substring(0,
+                    SHARD_LABEL_LENGTH).toUpperCase();
+            let text = (first == last)?first:_(SHARD_TEXT).format(first,
+                    last);
+
+            if (name != null) {
+                text = _(SHARD_PROFILE_TEXT).format(name, text);
+            }
+
+            section.ab_insert(new ShardMenuItem(text, shard,
+                    this.options['show-icons'], this.options['icon-size']),
+                    this.options['split-profile-view']);
+            start = end;
+        }
+    },
+
+    /* build a task running an async operation which fills the records of a
+     * profile in: start(cancellable, done) kicks it off, calls done() once
+     * it's over, and may return a function releasing what the operation
+     * holds. The operation gets its own cancellable, which is cancelled
+     * along with the rebuild, or once SCAN_TIMEOUT has elapsed: a hung mount
+     * then only costs its own profile, which is left out of the menu */
+    _async_task: function(generation, directory, records, start) {
+        let cancellable = new Gio.Cancellable();
+        let release = null;
+        let timeout_id = 0;
+        let started = false;
+        let done = false;
+
+        let stop = function() {
+            if (timeout_id) {
+                Mainloop.source_remove(timeout_id);
+                timeout_id = 0;
+            }
+            cancellable.cancel();
+            if (release) {
+                release();
+                release = null;
+            }
+        };
+
+        let finish = Lang.bind(this, function() {
+            if (done) {
+                return;
+            }
+
+            done = true;
+            if (timeout_id) {
+                Mainloop.source_remove(timeout_id);
+                timeout_id = 0;
+            }
+            release = null;
+            this._scheduler.resume(generation);
+        });
+
+        this._scheduler.add_cleanup(stop);
+
+        return Lang.bind(this, function() {
+            if ((!started) && (!done)) {
+                started = true;
+                timeout_id = Mainloop.timeout_add_seconds(SCAN_TIMEOUT,
+                        function() {
+                            timeout_id = 0;
+                            global.log(_(ERROR_SCAN_TIMEOUT).format(
+                                    directory));
+                            stop();
+                            records.length = 0;
+                            finish();
+                            return false;
+                        });
+                release = start(cancellable, finish);
+            }
+            return ((done)?Scheduler.TASK_DONE:Scheduler.TASK_WAIT);
+        });
+    },
+
+    /* insert the entry in alphabetical order */
+    _insert_entry: function(submenu, entry_path, entry) {
+        let menuitem = new WebAppMenuItem(entry_path, entry,
+                this.options['show-icons'], this.options['icon-size'], {});
+
+        submenu.ab_insert(menuitem, this.options['split-profile-view']);
     },
 
     destroy: function()
     {
-        this._appSystem.disconnect(this.sigcon);
-        this.monitor.cancel();
+        this._scheduler.destroy();
+        if (this._probe_id) {
+            Mainloop.source_remove(this._probe_id);
+            this._probe_id = 0;
+        }
+        for each (let probe in this._probes) {
+            if (probe['timeout_id']) {
+                Mainloop.source_remove(probe['timeout_id']);
+                probe['timeout_id'] = 0;
+            }
+            probe['cancellable'].cancel();
+        }
+        this._probes = {};
+        this._probe_backoff = {};
+        for (let wm_class in pending_launches) {
+            end_launch_tracking(wm_class);
+        }
+        if (save_id) {
+            save_launch_history();
+        }
+        disconnect_counted(this._appSystem, this.sigcon);
+        disconnect_counted(this.menu, this.open_id);
+        for each (let system_monitor in this.system_monitors) {
+            disconnect_counted(system_monitor['monitor'],
+                    system_monitor['id']);
+            system_monitor['monitor'].cancel();
+            live_monitors--;
+        }
+        this.system_monitors = [];
+        if (this.monitor) {
+            disconnect_counted(this.monitor, this.monitor_id);
+            this.monitor.cancel();
+            live_monitors--;
+        }
         this.actor._delegate = null;
         this.menu.destroy();
         this.actor.destroy();
@@ -521,6 +1334,8 @@ WebAppExtension.prototype = {
 let webapps;
 let md;
 let _;
+let Scheduler;
+let Scan;
 
 function compare_versions(a, b) {
     let c = (a.length < b.length)?a:b;
@@ -535,7 +1350,6 @@ function compare_versions(a, b) {
 }
 
 function init_localizations(metadata) {
-    let langs = GLib.get_language_names();
     let locale_dirs = new Array(GLib.build_filenamev([metadata.path,
             LOCALE_SUBDIR]));
     let domain;
@@ -565,9 +1379,24 @@ function init_localizations(metadata) {
     }
 }
 
+/* load a module shipped along with the extension */
+function import_extension_module(path, name) {
+    let module;
+
+    imports.searchPath.unshift(path);
+    try {
+        module = imports[name];
+    } finally {
+        imports.searchPath.shift();
+    }
+    return module;
+}
+
 function init(metadata) {
     md = metadata;
     init_localizations(metadata);
+    Scheduler = import_extension_module(metadata.path, SCHEDULER_MODULE);
+    Scan = import_extension_module(metadata.path, SCAN_MODULE);
 }
 
 function enable() {
@@ -576,5 +1405,18 @@ function enable() {
 
 function disable() {
     webapps.destroy();
+    webapps = null;
+
+    /* a later enable() starts from scratch: nothing read or counted so far
+     * is kept alive while the extension is off */
+    if (DEBUG_COUNTERS) {
+        global.log(_(DEBUG_DISABLE_TEXT).format(live_items, live_signals,
+                live_monitors));
+    }
+    Scan.clear_entry_cache();
+    reset_launch_state();
+    live_items = 0;
+    live_signals = 0;
+    live_monitors = 0;
 }
 
@@ -0,0 +1,538 @@
+/* -*- mode: js2 - indent-tabs-mode: nil - js2-basic-offset: 4 -*- */
+/*
+ * Profile scanning for the web application menu extension.
+ * Copyright (C) 2012  Andrea Santilli <andreasantilli gmx com>
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+ * USA.
+ */
+
+/* everything here only needs GLib and Gio, so that the rules deciding which
+ * entries get shown can be tested outside of the Shell */
+const Gio   = imports.gi.Gio;
+const GLib  = imports.gi.GLib;
+
+/* from epiphany (which took it from libgnome in its turn) */
+const APP_NAME              = 'epiphany';
+const APP_PREFIX            = 'app-';
+const DIR_PREFIX            = APP_PREFIX + APP_NAME + '-';
+const ENTRY_EXT             = '.desktop';
+const GNOME_ENV             = 'GNOME';
+const DESKTOP_GROUP         = 'Desktop Entry';
+const NAME_KEY              = 'Name';
+const LANGS_SEPARATOR       = ':';
+const SCAN_CHUNK_SIZE       = 16;
+const SCAN_ATTRIBUTES       = 'standard::name,standard::type';
+const LINK_ATTRIBUTES       = 'standard::is-symlink,standard::symlink-target';
+
+/* entries of the system index carry the modification time of their desktop
+ * file, so that an edited file gets read again */
+function is_valid_index_entry(index_entry) {
+    return ((index_entry != undefined) &&
+            (index_entry['path'] != undefined) &&
+            (index_entry['path'].constructor == String) &&
+            (index_entry['names'] != undefined) &&
+            (index_entry['names'].constructor == Object) &&
+            (index_entry['mtime'] != undefined) &&
+            (index_entry['mtime'].constructor == Number));
+}
+
+/* languages used to pick the translations of the entry names */
+let language_names = [];
+
+/* data read from the desktop files, indexed by path. An element is only
+ * valid as long as the modification time of its file and the language list
+ * don't change */
+let entry_cache = {};
+
+/* pick the best translation available for a localized key */
+function localized_value(lookup, key) {
+    for each (let lang in language_names) {
+        let value = lookup(key + '[' + lang + ']');
+
+        if (value != undefined) {
+            return value;
+        }
+    }
+    return lookup(key);
+}
+
+/* ditch the cached names if the languages have changed in the meantime */
+function update_language_names() {
+    let langs = GLib.get_language_names();
+
+    if (langs.join(LANGS_SEPARATOR) != language_names.join(LANGS_SEPARATOR)) {
+        language_names = langs;
+        entry_cache = {};
+    }
+}
+
+/* precompute a key for sorting names case insensitively. Every name gets
+ * the same kind of key, which is then compared the way the user's locale
+ * wants. Collation keys would save some work, but they aren't always valid
+ * strings */
+function get_sort_key(text) {
+    return GLib.utf8_casefold(text, -1);
+}
+
+function compare_sort_keys(a, b) {
+    return GLib.utf8_collate(a, b);
+}
+
+/* the length in bytes of a string once encoded as UTF-8 */
+function get_utf8_length(text) {
+    return unescape(encodeURIComponent(text)).length;
+}
+
+/* build a cache element out of the contents of a desktop file, which has
+ * been read already: the disk isn't touched here */
+function load_entry(entry_path, mtime, data) {
+    let keyfile = new GLib.KeyFile();
+    let entry;
+    let app;
+    let name;
+
+    try {
+        keyfile.load_from_data(data, get_utf8_length(data),
+                GLib.KeyFileFlags.NONE);
+        app = Gio.DesktopAppInfo.new_from_keyfile(keyfile);
+    } catch (e) {
+        app = null;
+    }
+
+    if (!app) {
+        delete entry_cache[entry_path];
+        return null;
+    }
+
+    name = localized_value(function(key) {
+        if (!(keyfile.has_key(DESKTOP_GROUP, key))) {
+            return undefined;
+        }
+        return keyfile.get_string(DESKTOP_GROUP, key);
+    }, NAME_KEY);
+
+    entry = {
+        'mtime': mtime,
+        'name': name,
+        'sort_key': get_sort_key(name),
+        'visible': ((!app.get_is_hidden()) && (app.get_show_in(GNOME_ENV))),
+        'gicon': app.get_icon(),
+        'generation': 0
+    };
+    entry_cache[entry_path] = entry;
+    return entry;
+}
+
+/* read a desktop file asynchronously and build its cache element out of
+ * what has been read, so that the Shell never waits for the disk */
+function read_entry(file, entry_path, mtime, cancellable, callback) {
+    file.load_contents_async(cancellable, function(file, result) {
+        let contents;
+
+        try {
+            contents = file.load_contents_finish(result)[1];
+        } catch (e) {
+            callback(null);
+            return;
+        }
+        callback(load_entry(entry_path, mtime, String(contents)));
+    });
+}
+
+/* fetch the modification time of a file without blocking the Shell. The
+ * callback gets null if the file can't be reached */
+function query_mtime(file, cancellable, callback) {
+    file.query_info_async(Gio.FILE_ATTRIBUTE_TIME_MODIFIED,
+            Gio.FileQueryInfoFlags.NONE, GLib.PRIORITY_LOW, cancellable,
+            function(file, result) {
+                let mtime;
+
+                try {
+                    mtime = file.query_info_finish(result).get_attribute_uint64(
+                            Gio.FILE_ATTRIBUTE_TIME_MODIFIED);
+                } catch (e) {
+                    callback(null);
+                    return;
+                }
+                callback(mtime);
+            });
+}
+
+/* look a desktop file up without blocking the Shell. It's only parsed again
+ * if it has changed since it was cached. The callback gets the cache
+ * element, or null if the file is missing or broken */
+function lookup_entry(entry_path, cancellable, callback) {
+    let file = Gio.file_new_for_path(entry_path);
+
+    query_mtime(file, cancellable, function(mtime) {
+        let entry = entry_cache[entry_path];
+
+        if (mtime == null) {
+            if (!(cancellable.is_cancelled())) {
+                delete entry_cache[entry_path];
+            }
+            callback(null);
+            return;
+        }
+
+        if ((entry != undefined) && (entry.mtime == mtime)) {
+            callback(entry);
+            return;
+        }
+        read_entry(file, entry_path, mtime, cancellable, callback);
+    });
+}
+
+/* check that the user has linked an entry into the given applications
+ * directory. The callback gets the outcome */
+function check_xdg_link(entry_path, xdg_dir, cancellable, callback) {
+    let xdg_path = GLib.build_filenamev([ xdg_dir,
+            GLib.path_get_basename(entry_path) ]);
+
+    Gio.file_new_for_path(xdg_path).query_info_async(LINK_ATTRIBUTES,
+            Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS, GLib.PRIORITY_LOW,
+            cancellable, function(file, result) {
+                let info;
+
+                try {
+                    info = file.query_info_finish(result);
+                } catch (e) {
+                    callback(false);
+                    return;
+                }
+
+                callback((info.get_is_symlink()) &&
+                        (info.get_symlink_target() == entry_path));
+            });
+}
+
+/* check an element of a profile directory, as listed by its enumerator. The
+ * callback gets the path and the cache element of its desktop file if it's
+ * to be shown, or nulls otherwise. Entries are only shown if they're linked
+ * into xdg_dir, unless that's null. Whatever gets looked up is marked as
+ * seen by the given rebuild */
+function check_element(config_path, info, xdg_dir, generation, cancellable,
+        callback) {
+    let element = info.get_name();
+    let entry_path;
+
+    /* check whether the file is a directory whose name begins by
+     * app-epiphany- */
+    if ((!(GLib.str_has_prefix(element, DIR_PREFIX))) ||
+            (info.get_file_type() != Gio.FileType.DIRECTORY)) {
+        callback(null, null);
+        return;
+    }
+
+    /* try to build a valid entry for the desktop file
+     * the full path name for the entry file is:
+     *
+     * [PDIR]/app-epiphany-[NAME]-[DIG]/epiphany-[NAME]-[DIG].desktop
+     *
+     * where:
+     * PDIR is the profile directory;
+     * NAME is the desktop entry name (Name key);
+     * DIG is the wm_class-entry_name digest.
+     * */
+    entry_path = GLib.build_filenamev([ config_path, element,
+            element.substring(APP_PREFIX.length) + ENTRY_EXT ]);
+    lookup_entry(entry_path, cancellable, function(entry) {
+        if ((entry == null) || (cancellable.is_cancelled())) {
+            callback(null, null);
+            return;
+        }
+        entry['generation'] = generation;
+
+        /* ditch the entry if hidden or not visible in gnome */
+        if (!entry['visible']) {
+            callback(null, null);
+            return;
+        }
+
+        if (xdg_dir == null) {
+            callback(entry_path, entry);
+            return;
+        }
+
+        check_xdg_link(entry_path, xdg_dir, cancellable, function(linked) {
+            if ((linked) && (!(cancellable.is_cancelled()))) {
+                callback(entry_path, entry);
+            } else {
+                callback(null, null);
+            }
+        });
+    });
+}
+
+/* read a profile directory asynchronously, a few elements at a time, so
+ * that neither a slow disk nor a hung mount can block the Shell. on_entry
+ * gets the path and the cache element of each entry to be shown, and
+ * on_done is called once the whole directory has been read, with false if
+ * it couldn't be opened. Neither is called once the scan is cancelled. The
+ * function returned closes the directory, for when the scan gets cancelled:
+ * a read in flight takes care of that on its own */
+function scan_directory(config_path, xdg_dir, generation, cancellable,
+        on_entry, on_done) {
+    let enumerator = null;
+    let fetching = false;
+
+    let close = function() {
+        if (enumerator) {
+            try {
+                enumerator.close(null);
+            } catch (e) {
+            }
+            enumerator = null;
+        }
+    };
+
+    let finish = function(success) {
+        close();
+        on_done(success);
+    };
+
+    let fetch = function() {
+        fetching = true;
+        enumerator.next_files_async(SCAN_CHUNK_SIZE, GLib.PRIORITY_LOW,
+                cancellable, function(source, result) {
+            let infos;
+            let left;
+
+            fetching = false;
+            if (cancellable.is_cancelled()) {
+                close();
+                return;
+            }
+
+            try {
+                infos = enumerator.next_files_finish(result);
+            } catch (e) {
+                finish(true);
+                return;
+            }
+
+            left = infos.length;
+            if (!left) {
+                finish(true);
+                return;
+            }
+
+            for each (let info in infos) {
+                check_element(config_path, info, xdg_dir, generation,
+                        cancellable, function(entry_path, entry) {
+                    /* the directory of a cancelled scan has been closed
+                     * already */
+                    if (cancellable.is_cancelled()) {
+                        return;
+                    }
+
+                    if (entry != null) {
+                        on_entry(entry_path, entry);
+                    }
+
+                    left--;
+                    if (left) {
+                        return;
+                    }
+
+                    if (infos.length < SCAN_CHUNK_SIZE) {
+                        finish(true);
+                    } else {
+                        fetch();
+                    }
+                });
+            }
+        });
+    };
+
+    fetching = true;
+    Gio.file_new_for_path(config_path).enumerate_children_async(
+            SCAN_ATTRIBUTES, Gio.FileQueryInfoFlags.NONE, GLib.PRIORITY_LOW,
+            cancellable, function(dir, result) {
+        fetching = false;
+        try {
+            enumerator = dir.enumerate_children_finish(result);
+        } catch (e) {
+            if (!(cancellable.is_cancelled())) {
+                on_done(false);
+            }
+            return;
+        }
+
+        if (cancellable.is_cancelled()) {
+            close();
+            return;
+        }
+        fetch();
+    });
+
+    return function() {
+        if (!fetching) {
+            close();
+        }
+    };
+}
+
+/* build a cache element out of an entry of the system index, whose desktop
+ * file is known to be unchanged since the index was built. No file is read */
+function load_index_entry(index_entry) {
+    let entry = entry_cache[index_entry['path']];
+    let gicon = null;
+    let name;
+
+    if ((entry != undefined) && (entry.mtime == index_entry['mtime'])) {
+        return entry;
+    }
+
+    name = localized_value(function(key) {
+        return index_entry['names'][key];
+    }, NAME_KEY);
+    if (name == undefined) {
+        return null;
+    }
+
+    if (index_entry['icon'] != undefined) {
+        try {
+            gicon = Gio.icon_new_for_string(index_entry['icon']);
+        } catch (e) {
+            gicon = null;
+        }
+    }
+
+    /* indexes written before hidden entries were kept only list the
+     * visible ones */
+    entry = {
+        'mtime': index_entry['mtime'],
+        'name': name,
+        'sort_key': get_sort_key(name),
+        'visible': (index_entry['visible'] != false),
+        'gicon': gicon,
+        'generation': 0
+    };
+    entry_cache[index_entry['path']] = entry;
+    return entry;
+}
+
+/* look an entry of the system index up. Its desktop file is checked
+ * asynchronously, and read again if it has been edited since the index was
+ * built. The callback gets the cache element, or null if the file is missing
+ * or broken */
+function lookup_index_entry(index_entry, cancellable, callback) {
+    let file = Gio.file_new_for_path(index_entry['path']);
+
+    query_mtime(file, cancellable, function(mtime) {
+        let entry = entry_cache[index_entry['path']];
+
+        if (mtime == null) {
+            callback(null);
+            return;
+        }
+
+        if (mtime == index_entry['mtime']) {
+            callback(load_index_entry(index_entry));
+            return;
+        }
+
+        if ((entry != undefined) && (entry.mtime == mtime)) {
+            callback(entry);
+            return;
+        }
+        read_entry(file, index_entry['path'], mtime, cancellable, callback);
+    });
+}
+
+/* forget about the files that weren't seen by the given rebuild */
+function prune_entry_cache(generation) {
+    for (let path in entry_cache) {
+        if (entry_cache[path].generation != generation) {
+            delete entry_cache[path];
+        }
+    }
+}
+
+/* the cache element of a desktop file, if it's known */
+function get_cached_entry(entry_path) {
+    return entry_cache[entry_path];
+}
+
+function clear_entry_cache() {
+    entry_cache = {};
+}
+
+/* add the entries of a system profile out of its index, a few at a time.
+ * The index is only trusted as long as the profile directory and each
+ * desktop file keep the modification time it records: a stale directory
+ * gets scanned instead, and a stale entry is read from its file. Everything
+ * is checked asynchronously. The callbacks and the function returned work
+ * as for scan_directory() */
+function read_index(directory, indexed, generation, cancellable, on_entry,
+        on_done) {
+    let entries = indexed['entries'];
+    let release = null;
+    let i = 0;
+
+    let next_chunk = function() {
+        let end = Math.min(i + SCAN_CHUNK_SIZE, entries.length);
+        let left = end - i;
+
+        if (!left) {
+            on_done(true);
+            return;
+        }
+
+        for (; i < end; i++) {
+            let index_entry = entries[i];
+
+            lookup_index_entry(index_entry, cancellable, function(entry) {
+                if (cancellable.is_cancelled()) {
+                    return;
+                }
+
+                if (entry != null) {
+                    entry['generation'] = generation;
+                    if (entry['visible']) {
+                        on_entry(index_entry['path'], entry);
+                    }
+                }
+
+                left--;
+                if (!left) {
+                    next_chunk();
+                }
+            });
+        }
+    };
+
+    query_mtime(Gio.file_new_for_path(directory), cancellable,
+            function(mtime) {
+        if (cancellable.is_cancelled()) {
+            return;
+        }
+
+        if (mtime != indexed['mtime']) {
+            release = scan_directory(directory, null, generation,
+                    cancellable, on_entry, on_done);
+            return;
+        }
+        next_chunk();
+    });
+
+    return function() {
+        if (release) {
+            release();
+        }
+    };
+}
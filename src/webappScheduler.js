@@ -0,0 +1,170 @@
+/* -*- mode: js2 - indent-tabs-mode: nil - js2-basic-offset: 4 -*- */
+/*
+ * Menu rebuild scheduler for the web application menu extension.
+ * Copyright (C) 2012  Andrea Santilli <andreasantilli gmx com>
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+ * USA.
+ */
+
+const Gio   = imports.gi.Gio;
+const Lang  = imports.lang;
+
+/* values returned by the tasks of a rebuild */
+const TASK_DONE     = 0;    /* go on with the next task */
+const TASK_AGAIN    = 1;    /* run the same task again at the next slice */
+const TASK_WAIT     = 2;    /* an async operation is in flight: the task
+                             * calls resume() once it's over, and then gets
+                             * run again */
+
+function RebuildScheduler() {
+    this._init.apply(this, arguments);
+}
+
+/* rebuilds are serialized: each one gets its own generation number and its
+ * own cancellable, and whatever is left of an older generation gets dropped.
+ * build_tasks(generation, cancellable) returns the list of tasks making up a
+ * rebuild. The main loop is passed in, so that the scheduler can be driven by
+ * hand */
+RebuildScheduler.prototype = {
+    _init: function(mainloop, build_tasks) {
+        this._mainloop = mainloop;
+        this._build_tasks = build_tasks;
+        this.generation = 0;
+        this.cancellable = null;
+        this._queued_id = 0;
+        this._step_id = 0;
+        this._waiting = false;
+        this._tasks = [];
+        this._cleanups = [];
+    },
+
+    /* schedule a rebuild. Any trigger arriving while a rebuild is already
+     * queued is merged into it, so that a burst of signals only costs a
+     * single scan */
+    queue: function() {
+        if (this._queued_id) {
+            return;
+        }
+
+        this._queued_id = this._mainloop.idle_add(Lang.bind(this,
+                this._start));
+    },
+
+    /* whether a rebuild is queued or in progress */
+    is_busy: function() {
+        return ((this._queued_id != 0) || (this._tasks.length > 0));
+    },
+
+    /* run a function releasing the resources held by the current rebuild,
+     * such as open directories, if it ever gets cancelled */
+    add_cleanup: function(cleanup) {
+        this._cleanups.push(cleanup);
+    },
+
+    /* stop the rebuild in progress, if any. Its async operations are
+     * cancelled and its remaining work is thrown away */
+    cancel: function() {
+        let cleanups = this._cleanups;
+
+        if (this._step_id) {
+            this._mainloop.source_remove(this._step_id);
+            this._step_id = 0;
+        }
+
+        if (this.cancellable) {
+            this.cancellable.cancel();
+            this.cancellable = null;
+        }
+
+        this._waiting = false;
+        this._tasks = [];
+        this._cleanups = [];
+        for (let i = 0; i < cleanups.length; i++) {
+            cleanups[i]();
+        }
+    },
+
+    /* go on with a rebuild whose task was waiting for an async operation.
+     * Nothing happens if that rebuild has been superseded meanwhile */
+    resume: function(generation) {
+        if ((generation != this.generation) || (!this._waiting)) {
+            return;
+        }
+
+        this._waiting = false;
+        this._schedule(generation);
+    },
+
+    destroy: function() {
+        if (this._queued_id) {
+            this._mainloop.source_remove(this._queued_id);
+            this._queued_id = 0;
+        }
+        this.cancel();
+    },
+
+    _start: function() {
+        let generation;
+
+        this._queued_id = 0;
+        this.cancel();
+        generation = ++this.generation;
+        this.cancellable = new Gio.Cancellable();
+        this._tasks = this._build_tasks(generation, this.cancellable);
+        this._schedule(generation);
+
+        return false;
+    },
+
+    _schedule: function(generation) {
+        this._step_id = this._mainloop.idle_add(Lang.bind(this, function() {
+            return this._run_task(generation);
+        }));
+    },
+
+    /* run a slice of the current rebuild. Results coming from an older
+     * generation are stale, so they never reach the menu */
+    _run_task: function(generation) {
+        let result;
+
+        if (generation != this.generation) {
+            return false;
+        }
+
+        if (this._tasks.length) {
+            result = this._tasks[0]();
+            if (result == TASK_WAIT) {
+                this._step_id = 0;
+                this._waiting = true;
+                return false;
+            }
+
+            if (result == TASK_DONE) {
+                this._tasks.shift();
+            }
+        }
+
+        if (!(this._tasks.length)) {
+            /* nothing is left to cancel */
+            this._step_id = 0;
+            this.cancellable = null;
+            this._cleanups = [];
+            return false;
+        }
+
+        return true;
+    }
+};
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+# Read-ahead helper for the Web Application Menu extension for the GNOME Shell.
+# Copyright (C) 2012  Andrea Santilli <andreasantilli gmx com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+# the extension runs this when its menu opens, that is right when the disk may
+# still be cold. that's why only the standard library is used here: loading
+# the toolkit the configurator needs would cost more than what's read ahead
+
+import ctypes.util
+import ctypes
+import sys
+import os
+
+# from <fcntl.h>, for interpreters that don't expose posix_fadvise (python
+# before 3.3). the value is the one used by linux
+LINUX_FADV_WILLNEED = 3
+
+# find a way to hint the kernel about a file, or None if there's none: the
+# file is skipped then, since reading it all would cost more than it saves
+def get_advise():
+    if hasattr(os, 'posix_fadvise'):
+        return lambda fd: os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        fadvise = libc.posix_fadvise64
+    except (OSError, AttributeError, TypeError):
+        return None
+    fadvise.argtypes = [ ctypes.c_int, ctypes.c_int64, ctypes.c_int64,
+            ctypes.c_int ]
+    fadvise.restype = ctypes.c_int
+    return lambda fd: fadvise(fd, 0, 0, LINUX_FADV_WILLNEED)
+
+# hint the kernel about files that are going to be read soon. directories
+# are not walked recursively, just their files are considered
+def read_ahead(paths, advise=None):
+    if advise is None:
+        advise = get_advise()
+    if advise is None:
+        return
+
+    for path in paths:
+        if os.path.isdir(path):
+            try:
+                files = [ os.path.join(path, name) for name in
+                        os.listdir(path) ]
+            except OSError:
+                continue
+        else:
+            files = [ path ]
+
+        for name in files:
+            if not os.path.isfile(name):
+                continue
+            try:
+                fd = os.open(name, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                advise(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+def main():
+    read_ahead(sys.argv[1:])
+
+if __name__ == '__main__':
+    main()
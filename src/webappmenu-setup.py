@@ -21,21 +21,42 @@
 from gi.repository import Gio, GLib, GObject, Gtk
 from glib.option import OptionParser, make_option
 from collections import deque
+import threading
+import traceback
 import gettext
+import copy
 import json
+import stat
+import time
 import sys
 import os
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 # general strings
 ADD_PROFILE_DIALOG      = "Add profile"
 DEF_PROFILE_TEXT        = "Use the default profile"
 DELETE_PROFILE_DIALOG   = "Row deletion"
 DELETE_PROFILE_TEXT     = "Delete the currently selected profile?"
 DIR_CHOOSER_TITLE       = "Browse directories"
+DISCOVER_DIALOG         = "Profile discovery"
+DISCOVER_PROGRESS       = "%d directories scanned, %d profiles found"
+DISCOVER_ROOT_TITLE     = "Choose where to look for profiles"
+DISCOVERED_NAME         = "%s (%d)"
+EXPORT_TITLE            = "Export profiles"
 HIDE_NON_XDG_TEXT       = "Hide entries not in user's application path"
 ICON_SIZE_TEXT          = "Icon size"
+IMPORT_TITLE            = "Import profiles"
+JSON_FILTER_TEXT        = "JSON files"
+LOADING_TEXT            = "Loading settings..."
+PREWARM_TEXT            = "Applications to preload when the menu opens"
+SHARD_THRESHOLD_TEXT    = "Split profiles holding more applications than"
 PROFILE_NAME            = "Profile name"
 PROFILE_DIR             = "Directory"
+PROFILE_QUARANTINED     = "Quarantined"
 QUIT_DIALOG             = "Really quit?"
 QUIT_TEXT               = "Quit without saving your changes?"
 RELOAD_DIALOG           = "Really reload?"
@@ -46,10 +67,32 @@ TAB_1_LABEL             = "General"
 TAB_2_LABEL             = "Other profiles"
 WINDOW_TITLE            = "Web App Menu Extension Options"
 
+# health report
+REPORT_DEFAULT_PROFILE  = "Default profile"
+REPORT_ENTRIES          = "  entries: %d, invalid: %d\n"
+REPORT_LAUNCHES         = "Launches, from the click to the window showing up:\n"
+REPORT_LAUNCH_COLD      = "cold"
+REPORT_LAUNCH_PREWARMED = "read ahead"
+REPORT_LAUNCH_STATS     = "  %s: %d launches, %.0f ms on average\n"
+REPORT_HUNG             = "not responding"
+REPORT_NOT_DIR          = "not a directory"
+REPORT_OK               = "reachable"
+REPORT_PROFILE          = "%s (%s)\n"
+REPORT_QUARANTINED      = "  quarantine flag set\n"
+REPORT_RELEASED         = "  quarantine flag cleared\n"
+REPORT_STATUS           = "  status: %s\n"
+REPORT_SUGGESTION       = "  suggestion: quarantine this profile\n"
+REPORT_TIMES            = "  scan time: %.1f ms, stat latency: p50 %.2f ms, \
+p90 %.2f ms, p99 %.2f ms\n"
+REPORT_UNREADABLE       = "unreadable"
+
 # actions
 BROWSE_PROFILE_TEXT     = "Choose directory"
 DELETE_PROFILE_BTN_TEXT = "Delete"
+DISCOVER_PROFILES_TEXT  = "Discover profiles"
 EDIT_PROFILE_TEXT       = "Edit"
+EXPORT_PROFILES_TEXT    = "Export profiles"
+IMPORT_PROFILES_TEXT    = "Import profiles"
 MANAGE_DEFAULT          = "Manage default profile"
 MANAGE_PROFILE_TEXT     = "Manage applications"
 NEW_PROFILE_TEXT        = "New"
@@ -63,17 +106,26 @@ ERR_BASE_NOT_DIR    = "The base path is not a directory!"
 ERR_CANT_MKDIR      = "Could not create the base directory!"
 ERR_ENTRY_START     = "Problems detecting the following entries:\n%s"
 ERR_FILE_HELP       = "use data from the json file for reading and writing"
+ERR_INDEX_HELP      = "build the index of the system-wide profiles and quit"
+ERR_INDEX_PROFILE   = "Skipping profile \"%s\": %s\n"
+ERR_INDEX_SETTINGS  = "No valid list of profiles in \"%s\".\n"
+ERR_QUARANTINE_HELP = "with --report, flag unhealthy profiles so that the \
+extension skips them"
+ERR_REPORT_HELP     = "report about the health of the profiles and quit"
 ERR_FILE_NOT_FOUND  = "WARNING: file \"%s\" not found!\nOptions initialized \
 to their default values."
 ERR_FILE_WRITE      = "Error writing to file \"%s\":\n%s"
+ERR_IMPORT_FORMAT   = "File \"%s\" does not contain a list of profiles."
 ERR_FILE_UNREADABLE = "WARNING: could not read file \"%s\"!\nOptions \
 initialized to their default values."
 ERR_KEYS_START      = "Problems retrieving values for the following keys:\n"
+ERR_MORE_PROFILES   = "...and %d more\n"
 ERR_SPAWN           = "Spawning failure for command: %s"
 ERR_TITLE           = "Error"
 ERR_USAGE           = "- configurator for the web application menu"
 ERR_WRONG_ARGS      = "Wrong arguments"
 WARN_DEF_OPT_FILE   = "File name not specified, using %s by default.\n"
+INDEX_WRITTEN       = "Index \"%s\" written: %d profiles, %d entries.\n"
 
 # default option values
 DEFAULT_OPTIONS = {
@@ -82,12 +134,18 @@ DEFAULT_OPTIONS = {
     'use-default-profile'           : True,
     'split-profile-view'            : True,
     'hide-entries-not-in-xdg-dir'   : True,
+    'prewarm-count'                 : 0,
+    'shard-threshold'               : 50,
     'profiles'                      : []
 }
 
+# keys added by later releases: settings files written before them are fine
+# without, and just get the default values
+OPTIONAL_OPTIONS = [ 'prewarm-count', 'shard-threshold' ]
+
 # other useful constants
 APP_ID      = 'apps.gnome-shell.extensions.web-app-menu.configurator.file-'
-COLUMN      = { 'name': 0, 'dir': 1, 'num' : 2 }
+COLUMN      = { 'name': 0, 'dir': 1, 'quarantined': 2, 'num' : 3 }
 ERR_SIZE    = { 'x': 420, 'y': 150 }
 PADDING     = 3
 SPACING     = 3
@@ -95,7 +153,27 @@ SIZE        = { 'x': 500, 'y': 400 }
 SPIN_END    = 1024.0
 SPIN_START  = 4.0
 SPIN_STEP   = 1.0
-
+PREWARM_SPIN_END    = 32.0
+PREWARM_SPIN_START  = 0.0
+SHARD_SPIN_END      = 1024.0
+SHARD_SPIN_START    = 0.0
+MSEC_PER_SEC        = 1000.0
+PROBE_TIMEOUT       = 5.0
+SLOW_STAT_MSEC      = 250.0
+PERCENTILES         = [ 0.5, 0.9, 0.99 ]
+LOAD_CHUNK_SIZE     = 200
+SUMMARY_MAX_ROWS    = 10
+
+APP_PREFIX                  = 'app-'
+DIR_PREFIX                  = APP_PREFIX + 'epiphany-'
+DESKTOP_GROUP               = 'Desktop Entry'
+ENTRY_EXT                   = '.desktop'
+GNOME_ENV                   = 'GNOME'
+NAME_KEY                    = 'Name'
+DISCOVER_MAX_DEPTH          = 8
+DISCOVER_THREADS            = 4
+DISCOVER_UPDATE_MS          = 100
+JSON_PATTERN                = '*.json'
 HANDLE_MAIN_PROFILE_CMD     = 'epiphany about:applications'
 HANDLE_PROFILE_CMD          = 'epiphany -p --profile=\"%s\" about:applications'
 LOCALE_SUBDIR               = 'locale'
@@ -103,6 +181,16 @@ MD_NAME                     = 'metadata.json'
 
 DEFAULT_OPTION_FILE_PARTS = [ GLib.get_user_data_dir(), 'gnome-shell',
         'extensions', 'web-application-menu@atomant', 'settings.json' ]
+DEFAULT_PROFILE_PARTS = [ GLib.get_home_dir(), '.gnome2', 'epiphany' ]
+LAUNCH_HISTORY_PARTS = [ GLib.get_user_cache_dir(), 'web-application-menu',
+        'launches.json' ]
+
+# profiles shared by all the users and the index the extension reads them from
+SYSTEM_SETTINGS_PATH    = '/etc/web-application-menu/settings.json'
+SYSTEM_INDEX_PATH       = '/var/cache/web-application-menu/index.json'
+
+# python3 identifies all the strings as 'str'
+STR_TYPE = 'str' if sys.version_info.major >= 3 else 'unicode'
 
 # please don't use _() as it clashes with python's built-in _ symbol
 g = gettext.gettext
@@ -110,7 +198,8 @@ g = gettext.gettext
 class ColumnIds:
     LEFT    = 0
     RIGHT   = 1
-    NUM     = 2
+    TOGGLE  = 2
+    NUM     = 3
 
 class ColumnAttach:
     LEFT = 0
@@ -118,7 +207,7 @@ class ColumnAttach:
     RIGHT = 2
 
 class TableSize:
-    ROWS = 6
+    ROWS = 8
     COLUMNS = 2
 
 class MiscAlignment:
@@ -131,6 +220,104 @@ class MouseButtons:
     CENTER = 2
     RIGHT = 3
 
+# look for epiphany profiles below a root directory, using a pool of threads.
+# a profile is a directory containing at least one app-epiphany-* directory.
+# results are handed to the main loop as soon as they're found
+class ProfileFinder:
+    def __init__(self, root, on_found, on_done, max_depth=DISCOVER_MAX_DEPTH,
+            threads=DISCOVER_THREADS):
+        self.root = root
+        self.on_found = on_found
+        self.on_done = on_done
+        self.max_depth = max_depth
+        self.threads = threads
+        self.scanned = 0
+        self.found = 0
+        self.cancelled = False
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__pending = 0
+        self.__visited = set()
+
+    def start(self):
+        self.__push(self.root, 0)
+        if self.__pending == 0:
+            GLib.idle_add(self.on_done)
+            return
+        for i in range(self.threads):
+            worker = threading.Thread(target=self.__work)
+            worker.daemon = True
+            worker.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    # enqueue a directory unless it was already visited, which also breaks
+    # symlink loops
+    def __push(self, path, depth):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self.__lock:
+            if (st.st_dev, st.st_ino) in self.__visited:
+                return
+            self.__visited.add((st.st_dev, st.st_ino))
+            self.__pending += 1
+        self.__queue.put((path, depth))
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            path, depth = item
+            try:
+                if not self.cancelled:
+                    self.__scan(path, depth)
+            except Exception:
+                # a directory we can't make sense of mustn't stop the search,
+                # nor leave it waiting forever
+                traceback.print_exc()
+            finally:
+                with self.__lock:
+                    self.__pending -= 1
+                    done = (self.__pending == 0)
+            if done:
+                # wake the other workers up and let them quit
+                for i in range(self.threads):
+                    self.__queue.put(None)
+                GLib.idle_add(self.on_done)
+
+    def __scan(self, path, depth):
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return
+
+        is_profile = False
+        subdirs = []
+        for name in names:
+            full_path = os.path.join(path, name)
+            if not os.path.isdir(full_path):
+                continue
+            # applications are profiles in their own right, don't descend
+            if name.startswith(DIR_PREFIX):
+                is_profile = True
+            else:
+                subdirs.append(full_path)
+
+        with self.__lock:
+            self.scanned += 1
+            if is_profile:
+                self.found += 1
+        if is_profile and not self.cancelled:
+            GLib.idle_add(self.on_found, path)
+
+        if depth < self.max_depth:
+            for subdir in subdirs:
+                self.__push(subdir, depth + 1)
+
 class Configurator(Gtk.Application):
     def __init__(self, filename):
         self.filename = filename
@@ -149,17 +336,23 @@ class Configurator(Gtk.Application):
         wins = self.get_windows()
         if wins.__len__() == 0:
             # build window
+            self.load_serial = 0
             self.win = self.__build_main_window()
             self.win.show_all()
-
-            # retrieve options from json file
-            self.__load_config_from_file(self.file)
-
-            self.__connect_all()
             self.add_window(self.win)
+
+            # retrieve options from json file, the signals get connected once
+            # everything is in place
+            self.__load_config_from_file(self.file, self.__connect_all)
         else:
             wins[0].present()
 
+    # show a non-modal message on top of the window
+    def __show_info(self, message_type, text):
+        self.info_bar.set_message_type(message_type)
+        self.info_label.set_text(text)
+        self.info_bar.show()
+
     # show error messages in a dialog with scrollable text
     def __show_error(self, error_title, error_text):
         dialog = Gtk.Dialog()
@@ -272,6 +465,14 @@ class Configurator(Gtk.Application):
                 self.__set_changed(True)
                 self.profile_store.set(i, col, stripped)
 
+    def __on_quarantine_toggled_cb(self, path):
+        i = self.profile_store.get_iter_from_string(path)
+        if not(i is None):
+            self.__set_changed(True)
+            self.profile_store.set(i, COLUMN['quarantined'],
+                    not self.profile_store.get_value(i,
+                    COLUMN['quarantined']))
+
     # browse directory for the currently selected row
     def __on_browse_cb(self):
         res, i = self.selection.get_selected()
@@ -324,6 +525,170 @@ class Configurator(Gtk.Application):
                 print(g(ERR_SPAWN) % command)
                 print(e)
 
+    # recursively look for profiles under a chosen directory and add them as
+    # they are found
+    def __on_discover_cb(self):
+        chooser = Gtk.FileChooserDialog()
+        chooser.set_title(g(DISCOVER_ROOT_TITLE))
+        chooser.set_action(Gtk.FileChooserAction.SELECT_FOLDER)
+        chooser.add_button(Gtk.STOCK_OK, Gtk.ResponseType.OK)
+        chooser.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        chooser.set_current_folder(GLib.get_home_dir())
+        chooser.set_transient_for(self.win)
+        if chooser.run() != Gtk.ResponseType.OK:
+            chooser.destroy()
+            return
+        root = Gio.File.new_for_uri(chooser.get_uri()).get_path()
+        chooser.destroy()
+
+        known = self.__known_directories()
+        names = set([ profile['name'] for profile in
+                self.__collect_profiles() ])
+
+        dialog = Gtk.Dialog()
+        dialog.set_title(g(DISCOVER_DIALOG))
+        dialog.set_modal(True)
+        dialog.set_destroy_with_parent(True)
+        dialog.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        dialog.set_default_response(Gtk.ResponseType.CANCEL)
+        label = Gtk.Label(g(DISCOVER_PROGRESS) % (0, 0))
+        progress = Gtk.ProgressBar()
+        vbox = Gtk.VBox(homogeneous = False, spacing = SPACING)
+        vbox.pack_start(label, False, True, PADDING)
+        vbox.pack_start(progress, False, True, PADDING)
+        dialog.get_content_area().add(vbox)
+        dialog.set_transient_for(self.win)
+
+        def on_found(path):
+            if (not finder.cancelled) and (not os.path.realpath(path) in
+                    known):
+                known.add(os.path.realpath(path))
+                self.__set_changed(True)
+                i = self.profile_store.append()
+                self.profile_store.set(i, COLUMN['name'],
+                        discovered_profile_name(root, path, names),
+                        COLUMN['dir'], path)
+            return False
+        def on_done():
+            # the dialog is gone already if the user cancelled the search
+            if not finder.cancelled:
+                dialog.response(Gtk.ResponseType.OK)
+            return False
+        def on_update():
+            label.set_text(g(DISCOVER_PROGRESS) % (finder.scanned,
+                    finder.found))
+            progress.pulse()
+            return True
+
+        finder = ProfileFinder(root, on_found, on_done)
+        update_id = GLib.timeout_add(DISCOVER_UPDATE_MS, on_update)
+        dialog.show_all()
+        finder.start()
+        dialog.run()
+        finder.cancel()
+        GLib.source_remove(update_id)
+        dialog.destroy()
+
+    # add the profiles listed in a json file, either a settings file or an
+    # exported one
+    def __on_import_cb(self):
+        chooser = Gtk.FileChooserDialog()
+        chooser.set_title(g(IMPORT_TITLE))
+        chooser.set_action(Gtk.FileChooserAction.OPEN)
+        chooser.add_button(Gtk.STOCK_OK, Gtk.ResponseType.OK)
+        chooser.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        chooser.add_filter(build_json_filter())
+        chooser.set_transient_for(self.win)
+        if chooser.run() != Gtk.ResponseType.OK:
+            chooser.destroy()
+            return
+        file = Gio.File.new_for_uri(chooser.get_uri())
+        chooser.destroy()
+
+        [ values, err_title, err_str ] = read_json_file(file)
+        if err_str != None:
+            self.__show_error(err_title, err_str)
+            return
+        if type(values).__name__ == 'dict':
+            values = values.get('profiles')
+        if type(values).__name__ != 'list':
+            self.__show_error(g(ERR_TITLE),
+                    g(ERR_IMPORT_FORMAT) % file.get_path())
+            return
+
+        known = self.__known_directories()
+        error_text = ''
+        for j in range(len(values)):
+            profile = values[j]
+            if (not is_valid_profile(profile)):
+                error_text += (g(ERR_BAD_PROFILE) % (j + 1))
+                continue
+            if os.path.realpath(profile['directory']) in known:
+                continue
+            known.add(os.path.realpath(profile['directory']))
+            self.__set_changed(True)
+            i = self.profile_store.append()
+            self.profile_store.set(i, COLUMN['name'], profile['name'],
+                    COLUMN['dir'], profile['directory'],
+                    COLUMN['quarantined'], is_quarantined(profile))
+
+        if error_text != '':
+            self.__show_error(g(ERR_TITLE), g(ERR_ENTRY_START) % error_text)
+
+    # save the current profile list into a json file
+    def __on_export_cb(self):
+        chooser = Gtk.FileChooserDialog()
+        chooser.set_title(g(EXPORT_TITLE))
+        chooser.set_action(Gtk.FileChooserAction.SAVE)
+        chooser.set_do_overwrite_confirmation(True)
+        chooser.add_button(Gtk.STOCK_OK, Gtk.ResponseType.OK)
+        chooser.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        chooser.add_filter(build_json_filter())
+        chooser.set_transient_for(self.win)
+        if chooser.run() != Gtk.ResponseType.OK:
+            chooser.destroy()
+            return
+        path = Gio.File.new_for_uri(chooser.get_uri()).get_path()
+        chooser.destroy()
+
+        try:
+            encoded = str.encode(json.dumps({
+                'profiles': self.__collect_profiles() }))
+            GLib.file_set_contents(path, encoded)
+        except GObject.GError as write_error:
+            self.__show_error(g(ERR_TITLE),
+                    g(ERR_FILE_WRITE) % (path, write_error))
+
+    # read the profile list back from the tree view
+    def __collect_profiles(self):
+        profiles = []
+        def collect_profiles(model, path, i, rows=None):
+            profile = {
+                'name': model.get_value(i, COLUMN['name']),
+                'directory': model.get_value(i, COLUMN['dir'])
+            }
+            if model.get_value(i, COLUMN['quarantined']):
+                profile['quarantined'] = True
+            profiles.append(profile)
+            return False
+        self.profile_store.foreach(collect_profiles, None)
+        return profiles
+
+    # the directories already shown, resolved so that the same profile
+    # reached through different paths is only added once. the default
+    # profile is looked at anyway, when in use
+    def __known_directories(self):
+        known = set([ os.path.realpath(directory) for directory in
+                self.__collect_directories() ])
+        if self.def_profile.get_active():
+            known.add(os.path.realpath(GLib.build_filenamev(
+                    DEFAULT_PROFILE_PARTS)))
+        return known
+
+    def __collect_directories(self):
+        return [ profile['directory'] for profile in
+                self.__collect_profiles() ]
+
     # show a context menu for the treeview on right-click
     def __on_button_pressed_cb(self, e):
         if e.button == MouseButtons.RIGHT:
@@ -358,19 +723,11 @@ class Configurator(Gtk.Application):
                 ] = self.hide_non_xdg.get_active()
         self.options['icon-size'] = int(
                 round(self.icon_size_spin.get_value()))
-        self.options['profiles'] = []
-        def collect_profiles(model, path, i, rows=None):
-            indices = path.get_indices()
-            index = indices[0]
-            # we need to add a new empty dict to the list
-            self.options['profiles'].append({})
-            self.options['profiles'][index][
-                    'name'] = model.get_value(i, COLUMN['name'])
-            self.options['profiles'][index][
-                    'directory'] = model.get_value(i, COLUMN['dir'])
-            return False
-        args = []
-        self.profile_store.foreach(collect_profiles, args)
+        self.options['prewarm-count'] = int(
+                round(self.prewarm_spin.get_value()))
+        self.options['shard-threshold'] = int(
+                round(self.shard_spin.get_value()))
+        self.options['profiles'] = self.__collect_profiles()
 
         write_error = None
         try:
@@ -402,10 +759,10 @@ class Configurator(Gtk.Application):
             dialog.destroy()
             self.__disconnect_all()
             self.profile_store.clear()
-            self.__set_changed(False)
-            self.__load_config_from_file(self.file)
-            self.__connect_all()
-            self.selection.emit('changed')
+            def on_done():
+                self.__connect_all()
+                self.selection.emit('changed')
+            self.__load_config_from_file(self.file, on_done)
 
     # quit the app or show a confirm dialog in case of changes
     def __quit_cb(self):
@@ -427,9 +784,12 @@ class Configurator(Gtk.Application):
                 dialog.destroy()
                 return True
             
+            # drop any loading still in progress
+            self.load_serial += 1
             self.win.destroy()
             return False
 
+        self.load_serial += 1
         self.win.destroy()
         return False
 
@@ -459,10 +819,16 @@ class Configurator(Gtk.Application):
                 self.__set_changed(True)))
         self.id.append(self.icon_size_spin.connect('value-changed', lambda s:
                 self.__set_changed(True)))
+        self.id.append(self.prewarm_spin.connect('value-changed', lambda s:
+                self.__set_changed(True)))
+        self.id.append(self.shard_spin.connect('value-changed', lambda s:
+                self.__set_changed(True)))
         self.id.append(self.name_column.connect('edited', lambda c, p, n:
                 self.__on_edit_done_cb(p, n, COLUMN['name'])))
         self.id.append(self.dir_column.connect('edited', lambda c, p, n:
                 self.__on_edit_done_cb(p, n, COLUMN['dir'])))
+        self.id.append(self.quarantine_column.connect('toggled', lambda c, p:
+                self.__on_quarantine_toggled_cb(p)))
         self.id.append(self.button_reload.connect('clicked', lambda w:
                 self.__reload_cb()))
         self.id.append(self.button_apply.connect('clicked', lambda w:
@@ -477,8 +843,11 @@ class Configurator(Gtk.Application):
         self.split_view.disconnect(self.id.popleft())
         self.show_icons.disconnect(self.id.popleft())
         self.icon_size_spin.disconnect(self.id.popleft())
+        self.prewarm_spin.disconnect(self.id.popleft())
+        self.shard_spin.disconnect(self.id.popleft())
         self.name_column.disconnect(self.id.popleft())
         self.dir_column.disconnect(self.id.popleft())
+        self.quarantine_column.disconnect(self.id.popleft())
         self.button_reload.disconnect(self.id.popleft())
         self.button_apply.disconnect(self.id.popleft())
         self.hide_non_xdg.disconnect(self.id.popleft())
@@ -494,15 +863,27 @@ class Configurator(Gtk.Application):
     def __build_main_window(self):
         self.__build_popup()
 
-        notebook = Gtk.Notebook()
-        notebook.append_page(self.__build_controls(),
+        self.notebook = Gtk.Notebook()
+        self.notebook.append_page(self.__build_controls(),
                 Gtk.Label(g(TAB_1_LABEL)))
-        notebook.append_page(self.__build_profile_section(),
+        self.notebook.append_page(self.__build_profile_section(),
                 Gtk.Label(g(TAB_2_LABEL)))
 
+        # loading state and problems found in the settings, hidden until
+        # needed
+        self.info_bar = Gtk.InfoBar()
+        self.info_label = Gtk.Label()
+        self.info_label.set_alignment(MiscAlignment.LEFT, MiscAlignment.CENTER)
+        self.info_label.show()
+        self.info_bar.get_content_area().add(self.info_label)
+        self.info_bar.add_button(Gtk.STOCK_CLOSE, Gtk.ResponseType.CLOSE)
+        self.info_bar.connect('response', lambda b, r: b.hide())
+        self.info_bar.set_no_show_all(True)
+
         # the whole window contents in a box
         win_vbox = Gtk.VBox(homogeneous = False, spacing = SPACING)
-        win_vbox.pack_start(notebook, True, True, PADDING)
+        win_vbox.pack_start(self.info_bar, False, True, PADDING)
+        win_vbox.pack_start(self.notebook, True, True, PADDING)
         win_vbox.pack_start(self.__build_button_row(), False, True, PADDING)
         self.button_close.grab_focus()
 
@@ -551,6 +932,25 @@ class Configurator(Gtk.Application):
         self.item_manage.set_label(g(MANAGE_PROFILE_TEXT))
         self.item_manage.set_sensitive(False)
         self.popup_menu.add(self.item_manage)
+        self.popup_menu.add(Gtk.SeparatorMenuItem())
+        self.item_discover = Gtk.ImageMenuItem.new_from_stock(Gtk.STOCK_FIND,
+                None)
+        self.item_discover.set_label(g(DISCOVER_PROFILES_TEXT))
+        self.item_discover.connect('activate', lambda d:
+                self.__on_discover_cb())
+        self.popup_menu.add(self.item_discover)
+        self.item_import = Gtk.ImageMenuItem.new_from_stock(Gtk.STOCK_ADD,
+                None)
+        self.item_import.set_label(g(IMPORT_PROFILES_TEXT))
+        self.item_import.connect('activate', lambda d:
+                self.__on_import_cb())
+        self.popup_menu.add(self.item_import)
+        self.item_export = Gtk.ImageMenuItem.new_from_stock(
+                Gtk.STOCK_SAVE_AS, None)
+        self.item_export.set_label(g(EXPORT_PROFILES_TEXT))
+        self.item_export.connect('activate', lambda d:
+                self.__on_export_cb())
+        self.popup_menu.add(self.item_export)
         self.popup_menu.show_all()
 
     # create and place the widgets for the upper part of the dialog
@@ -570,6 +970,14 @@ class Configurator(Gtk.Application):
         
         hide_non_xdg_label = Gtk.Label(g(HIDE_NON_XDG_TEXT))
         self.hide_non_xdg = Gtk.Switch()
+
+        prewarm_label = Gtk.Label(g(PREWARM_TEXT))
+        self.prewarm_spin = Gtk.SpinButton.new_with_range(PREWARM_SPIN_START,
+            PREWARM_SPIN_END, SPIN_STEP)
+
+        shard_label = Gtk.Label(g(SHARD_THRESHOLD_TEXT))
+        self.shard_spin = Gtk.SpinButton.new_with_range(SHARD_SPIN_START,
+            SHARD_SPIN_END, SPIN_STEP)
         
         self.manage_default = Gtk.Button(g(MANAGE_DEFAULT))
         
@@ -603,6 +1011,10 @@ class Configurator(Gtk.Application):
             self.hide_non_xdg, top_attach, bottom_attach)
         [ top_attach, bottom_attach ] = add_row(icon_size_label,
             self.icon_size_spin, top_attach, bottom_attach)
+        [ top_attach, bottom_attach ] = add_row(prewarm_label,
+            self.prewarm_spin, top_attach, bottom_attach)
+        [ top_attach, bottom_attach ] = add_row(shard_label,
+            self.shard_spin, top_attach, bottom_attach)
         [ top_attach, bottom_attach ] = add_row(manage_default_label,
             self.manage_default, top_attach, bottom_attach)
 
@@ -648,7 +1060,8 @@ class Configurator(Gtk.Application):
     def __build_profile_section(self):
         self.profile_store = Gtk.ListStore(
                 GObject.type_from_name('gchararray'),
-                GObject.type_from_name('gchararray'))
+                GObject.type_from_name('gchararray'),
+                GObject.type_from_name('gboolean'))
 
         self.profile_view = Gtk.TreeView();
         self.profile_view.set_model(self.profile_store)
@@ -674,6 +1087,16 @@ class Configurator(Gtk.Application):
         self.profile_view.insert_column(column2, ColumnIds.RIGHT)
         column2.set_sort_column_id(ColumnIds.RIGHT)
 
+        # profiles can be quarantined by the health report. let the user
+        # release them by hand
+        self.quarantine_column = Gtk.CellRendererToggle()
+        column3 = Gtk.TreeViewColumn()
+        column3.set_title(g(PROFILE_QUARANTINED))
+        column3.pack_start(self.quarantine_column, False)
+        column3.add_attribute(self.quarantine_column, 'active',
+                COLUMN['quarantined'])
+        self.profile_view.insert_column(column3, ColumnIds.TOGGLE)
+
         column1.set_resizable(True)
         column2.set_resizable(True)
 
@@ -694,6 +1117,12 @@ class Configurator(Gtk.Application):
         self.tbtn_del.set_tooltip_text(g(DELETE_PROFILE_BTN_TEXT))
         self.tbtn_manage = Gtk.ToolButton.new_from_stock(Gtk.STOCK_PREFERENCES)
         self.tbtn_manage.set_tooltip_text(g(MANAGE_PROFILE_TEXT))
+        self.tbtn_discover = Gtk.ToolButton.new_from_stock(Gtk.STOCK_FIND)
+        self.tbtn_discover.set_tooltip_text(g(DISCOVER_PROFILES_TEXT))
+        self.tbtn_import = Gtk.ToolButton.new_from_stock(Gtk.STOCK_ADD)
+        self.tbtn_import.set_tooltip_text(g(IMPORT_PROFILES_TEXT))
+        self.tbtn_export = Gtk.ToolButton.new_from_stock(Gtk.STOCK_SAVE_AS)
+        self.tbtn_export.set_tooltip_text(g(EXPORT_PROFILES_TEXT))
         self.tbtn_new.connect('clicked', lambda d:
                 self.__on_new_cb())
         self.tbtn_edit.connect('clicked', lambda d:
@@ -706,6 +1135,12 @@ class Configurator(Gtk.Application):
                 self.__on_manage_cb())
         self.item_manage.connect('activate', lambda d:
                 self.__on_manage_cb())
+        self.tbtn_discover.connect('clicked', lambda d:
+                self.__on_discover_cb())
+        self.tbtn_import.connect('clicked', lambda d:
+                self.__on_import_cb())
+        self.tbtn_export.connect('clicked', lambda d:
+                self.__on_export_cb())
         
         toolbar = Gtk.Toolbar()
         toolbar.set_orientation(Gtk.Orientation.HORIZONTAL)
@@ -715,6 +1150,10 @@ class Configurator(Gtk.Application):
         toolbar.add(self.tbtn_browse)
         toolbar.add(self.tbtn_del)
         toolbar.add(self.tbtn_manage)
+        toolbar.add(Gtk.SeparatorToolItem())
+        toolbar.add(self.tbtn_discover)
+        toolbar.add(self.tbtn_import)
+        toolbar.add(self.tbtn_export)
         toolbar.get_style_context().add_class(Gtk.STYLE_CLASS_PRIMARY_TOOLBAR)
 
         self.tbtn_edit.set_sensitive(False)
@@ -728,120 +1167,452 @@ class Configurator(Gtk.Application):
 
         return hbox
 
-    # fetch data from the json file and eventually fix them in case of
-    # inconsistencies
-    def __load_config_from_file(self, file):
-        file_name = file.get_path()
+    # fetch data from the json file without blocking the window: the file is
+    # read asynchronously, parsed and checked in a worker thread, then the
+    # profile list is filled a chunk at a time. on_done is called at the end
+    def __load_config_from_file(self, file, on_done=None):
+        self.load_serial += 1
+        serial = self.load_serial
 
         self.options = {}
         self.__set_changed(False)
+        self.notebook.set_sensitive(False)
+        self.__show_info(Gtk.MessageType.INFO, g(LOADING_TEXT))
 
-        [ self.options, err_title, err_str] = read_json_file(file)
-        if err_str != None:
-            self.__set_changed(True)
-            self.options = DEFAULT_OPTIONS
-            self.__show_error(err_title, err_str)
-
-        # check and fix wrong values and data types taking care not to
-        # overwrite the already retrieved settings
-        def check_and_set(node, key, type_str, value):
-            ret = False
+        def on_checked(result):
+            if serial == self.load_serial:
+                self.__fill_options(serial, result, on_done)
+            return False
+        def work(data, err_str):
+            values = None
             try:
-                if type(node[key]).__name__ != type_str:
-                    node[key] = value
-                    self.__set_changed(True)
-                    ret = True
-            except KeyError as key_error:
-                node[key] = value
-                self.__set_changed(True)
-                ret = True
-            return ret
-
-        error1_text = ''
-        keys = []
-        if check_and_set(self.options, 'use-default-profile', 'bool',
-                DEFAULT_OPTIONS['use-default-profile']):
-            keys.append('use-default-profile')
-        if check_and_set(self.options, 'split-profile-view', 'bool',
-                DEFAULT_OPTIONS['split-profile-view']):
-            keys.append('split-profile-view')
-        if check_and_set(self.options, 'show-icons', 'bool',
-                DEFAULT_OPTIONS['show-icons']):
-            keys.append('show-icons')
-        if check_and_set(self.options, 'hide-entries-not-in-xdg-dir', 'bool',
-                DEFAULT_OPTIONS['hide-entries-not-in-xdg-dir']):
-            keys.append('hide-entries-not-in-xdg-dir')
-        if check_and_set(self.options, 'icon-size', 'int',
-                DEFAULT_OPTIONS['icon-size']):
-            keys.append('icon-size')
-        if check_and_set(self.options, 'profiles', 'list',
-                DEFAULT_OPTIONS['profiles']):
-            keys.append('profiles')
-        if keys != []:
-            error1_text = g(ERR_KEYS_START)
-            for i in range(len(keys)):
-                error1_text += keys[i] + '\n'
-            error1_text += '\n'
-
-        # destroy the invalid array entries
-        i = 0
-        j = 0
-        error2_text = ''
-        # python3 identifies all the strings as 'str'
-        type_str = 'str' if sys.version_info.major >= 3 else 'unicode'
-        while i < len(self.options['profiles']):
-            if (check_and_set(self.options['profiles'][i], 'name', type_str,
-                    '')) or (check_and_set(self.options['profiles'][i],
-                    'directory', type_str, '')):
-                del self.options['profiles'][i : i + 1]
-                error2_text += (g(ERR_BAD_PROFILE) % (j + 1))
-            else:
-                i += 1
-            j += 1
-        if error2_text != '':
-            error2_text = g(ERR_ENTRY_START) % error2_text
+                if err_str == None:
+                    [ values, _, err_str ] = parse_json_data(file, data)
+                if (err_str == None) and (type(values).__name__ != 'dict'):
+                    err_str = g(ERR_BAD_FORMAT) % file.get_path()
+                result = check_options(values, err_str)
+            except Exception:
+                # whatever goes wrong, the window must leave the loading
+                # state: fall back to the defaults, as for a broken file
+                traceback.print_exc()
+                result = check_options(None,
+                        g(ERR_BAD_FORMAT) % file.get_path())
+            GLib.idle_add(on_checked, result)
+        def start_worker(data, err_str):
+            worker = threading.Thread(target=work, args=(data, err_str))
+            worker.daemon = True
+            worker.start()
+        def on_loaded(source, result, data=None):
+            try:
+                [ _, contents, _ ] = file.load_contents_finish(result)
+            except GObject.GError as e:
+                start_worker(None, g(ERR_FILE_UNREADABLE) % file.get_path())
+                return
+            start_worker(contents, None)
 
-        error_text = error1_text + error2_text
-        if error_text != '':
-            self.__show_error(g(ERR_TITLE), error_text)
+        if not (file.query_exists(None)):
+            start_worker(None, g(ERR_FILE_NOT_FOUND) % file.get_path())
+        else:
+            file.load_contents_async(None, on_loaded, None)
+
+    # setup ui according to the checked options
+    def __fill_options(self, serial, result, on_done):
+        [ self.options, changed, error_text ] = result
 
-        # setup ui according to the options
         self.icon_size_spin.set_value(self.options['icon-size'])
+        self.prewarm_spin.set_value(self.options['prewarm-count'])
+        self.shard_spin.set_value(self.options['shard-threshold'])
         self.def_profile.set_active(self.options['use-default-profile'])
         self.manage_default.set_sensitive(self.options['use-default-profile'])
         self.split_view.set_active(self.options['split-profile-view'])
         self.show_icons.set_active(self.options['show-icons'])
         self.hide_non_xdg.set_active(
                 self.options['hide-entries-not-in-xdg-dir'])
-        for i in range(len(self.options['profiles'])):
-            it = self.profile_store.append()
-            self.profile_store.set_value(it, COLUMN['name'],
-                    self.options['profiles'][i]['name'])
-            self.profile_store.set_value(it, COLUMN['dir'],
-                    self.options['profiles'][i]['directory'])
 
-def read_json_file(file):
+        profiles = self.options['profiles']
+        position = [ 0 ]
+        def fill_chunk():
+            if serial != self.load_serial:
+                return False
+            for profile in profiles[position[0] : position[0] +
+                    LOAD_CHUNK_SIZE]:
+                it = self.profile_store.append()
+                self.profile_store.set(it, COLUMN['name'], profile['name'],
+                        COLUMN['dir'], profile['directory'],
+                        COLUMN['quarantined'], is_quarantined(profile))
+            position[0] += LOAD_CHUNK_SIZE
+            if position[0] < len(profiles):
+                return True
+
+            self.notebook.set_sensitive(True)
+            self.__set_changed(changed)
+            if error_text != '':
+                self.__show_info(Gtk.MessageType.WARNING, error_text)
+            else:
+                self.info_bar.hide()
+            if on_done != None:
+                on_done()
+            return False
+        GLib.idle_add(fill_chunk)
+
+# check and fix wrong values and data types taking care not to overwrite the
+# already retrieved settings. no ui is touched, so that this can run in a
+# separate thread. returns the fixed options, whether they were changed and
+# a summary of the problems found
+def check_options(values, err_str):
+    changed = False
+    error_text = ''
+    if err_str != None:
+        changed = True
+        values = copy.deepcopy(DEFAULT_OPTIONS)
+        error_text = err_str + '\n\n'
+
+    def check_and_set(node, key, type_str, value):
+        try:
+            if type(node[key]).__name__ == type_str:
+                return False
+        except KeyError as key_error:
+            pass
+        node[key] = value
+        return True
+
+    keys = []
+    for [ key, type_str ] in [ [ 'use-default-profile', 'bool' ],
+            [ 'split-profile-view', 'bool' ], [ 'show-icons', 'bool' ],
+            [ 'hide-entries-not-in-xdg-dir', 'bool' ], [ 'icon-size', 'int' ],
+            [ 'prewarm-count', 'int' ], [ 'shard-threshold', 'int' ],
+            [ 'profiles', 'list' ] ]:
+        if (not key in values) and (key in OPTIONAL_OPTIONS):
+            values[key] = copy.deepcopy(DEFAULT_OPTIONS[key])
+        elif check_and_set(values, key, type_str,
+                copy.deepcopy(DEFAULT_OPTIONS[key])):
+            keys.append(key)
+    if keys != []:
+        changed = True
+        error_text += g(ERR_KEYS_START)
+        for i in range(len(keys)):
+            error_text += keys[i] + '\n'
+        error_text += '\n'
+
+    # destroy the invalid array entries, listing just the first ones
+    profiles = []
+    bad_rows = []
+    for j in range(len(values['profiles'])):
+        if is_valid_profile(values['profiles'][j]):
+            profiles.append(values['profiles'][j])
+        else:
+            bad_rows.append(j)
+    values['profiles'] = profiles
+    if bad_rows != []:
+        changed = True
+        rows_text = ''
+        for j in bad_rows[: SUMMARY_MAX_ROWS]:
+            rows_text += (g(ERR_BAD_PROFILE) % (j + 1))
+        if len(bad_rows) > SUMMARY_MAX_ROWS:
+            rows_text += g(ERR_MORE_PROFILES) % (len(bad_rows) -
+                    SUMMARY_MAX_ROWS)
+        error_text += g(ERR_ENTRY_START) % rows_text
+
+    return [ values, changed, error_text.strip() ]
+
+# name a discovered profile after its path below the chosen root, leaving out
+# the usual .gnome2/epiphany tail: the profiles of many users on a shared
+# mount would all be called "epiphany" otherwise. names already taken get a
+# counter appended
+def discovered_profile_name(root, path, taken):
+    tail = os.path.join(*DEFAULT_PROFILE_PARTS[1:])
+    relative = os.path.relpath(path, root)
+    if relative == tail:
+        relative = os.curdir
+    elif relative.endswith(os.sep + tail):
+        relative = relative[: -len(os.sep + tail)]
+    if relative == os.curdir:
+        relative = os.path.basename(os.path.normpath(root)) or root
+
+    name = relative
+    count = 2
+    while name in taken:
+        name = g(DISCOVERED_NAME) % (relative, count)
+        count += 1
+    taken.add(name)
+    return name
+
+def is_valid_profile(profile):
+    return ((type(profile).__name__ == 'dict') and
+            (type(profile.get('name')).__name__ == STR_TYPE) and
+            (type(profile.get('directory')).__name__ == STR_TYPE))
+
+def is_quarantined(profile):
+    return profile.get('quarantined') is True
+
+def build_json_filter():
+    json_filter = Gtk.FileFilter()
+    json_filter.set_name(g(JSON_FILTER_TEXT))
+    json_filter.add_pattern(JSON_PATTERN)
+    return json_filter
+
+def parse_json_data(file, data):
     error_title = None
     error_string = None
     values = None
 
-    if not (file.query_exists(None)):
+    # too deeply nested data raises a RecursionError, that is a RuntimeError
+    try:
+        values = json.loads(data.decode('utf-8'))
+    except (ValueError, RuntimeError) as e:
         error_title = g(ERR_TITLE)
-        error_string = g(ERR_FILE_NOT_FOUND) % file.get_path()
-    else:
-        try:
-            _, data, _ = file.load_contents(None)
-        except GObject.GError as e:
-            error_title = g(ERR_TITLE)
-            error_string = g(ERR_FILE_UNREADABLE) % file.get_path()
-        else:
-            try:
-                values = json.loads(data.decode('utf-8'))
-            except ValueError as e:
-                error_title = g(ERR_TITLE)
-                error_string = g(ERR_BAD_FORMAT) % file.get_path()
+        error_string = g(ERR_BAD_FORMAT) % file.get_path()
     return [ values, error_title, error_string ]
 
+def read_json_file(file):
+    if not (file.query_exists(None)):
+        return [ None, g(ERR_TITLE), g(ERR_FILE_NOT_FOUND) % file.get_path() ]
+
+    try:
+        _, data, _ = file.load_contents(None)
+    except GObject.GError as e:
+        return [ None, g(ERR_TITLE),
+                g(ERR_FILE_UNREADABLE) % file.get_path() ]
+    return parse_json_data(file, data)
+
+# list the visible entries of a profile directory, following the same rules
+# as the extension. entries are matched against the user's application
+# directory only at runtime, so that check is left out. every translation of
+# the name is kept, since each user may have different languages.
+# application directories without a readable desktop file are counted as
+# invalid, and the latency of each stat() is appended to timings, if given.
+# with keep_hidden, hidden entries are listed as well, marked as such, so
+# that the extension notices when one of them is shown again
+def scan_profile_dir(directory, timings=None, keep_hidden=False):
+    entries = []
+    invalid = 0
+    for element in sorted(os.listdir(directory)):
+        if not element.startswith(DIR_PREFIX):
+            continue
+        full_path = os.path.join(directory, element)
+        start = time.time()
+        try:
+            mode = os.stat(full_path).st_mode
+        except OSError:
+            mode = 0
+        if timings is not None:
+            timings.append((time.time() - start) * MSEC_PER_SEC)
+        if not stat.S_ISDIR(mode):
+            continue
+
+        entry_path = os.path.join(full_path, element[len(APP_PREFIX):] +
+                ENTRY_EXT)
+        keyfile = GLib.KeyFile()
+        try:
+            # take the time before reading: if the file changes in the
+            # meantime, the extension will just read it again
+            mtime = int(os.stat(entry_path).st_mtime)
+            keyfile.load_from_file(entry_path, GLib.KeyFileFlags.NONE)
+        except (OSError, GObject.GError):
+            invalid += 1
+            continue
+        app = Gio.DesktopAppInfo.new_from_keyfile(keyfile)
+        if app is None:
+            invalid += 1
+            continue
+        visible = (not app.get_is_hidden()) and app.get_show_in(GNOME_ENV)
+        if (not visible) and (not keep_hidden):
+            continue
+
+        names = {}
+        [ keys, _ ] = keyfile.get_keys(DESKTOP_GROUP)
+        for key in keys:
+            if (key == NAME_KEY) or key.startswith(NAME_KEY + '['):
+                names[key] = keyfile.get_string(DESKTOP_GROUP, key)
+        icon = app.get_icon()
+        entry = {
+            'path': entry_path,
+            'mtime': mtime,
+            'names': names,
+            'icon': icon.to_string() if icon is not None else None
+        }
+        if keep_hidden:
+            entry['visible'] = visible
+        entries.append(entry)
+    return [ entries, invalid ]
+
+def percentile(values, fraction):
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+# scan a profile in a separate thread, so that a hung mount can't block us
+# for longer than the given timeout
+def probe_profile(directory, timeout=PROBE_TIMEOUT):
+    result = { 'status': REPORT_HUNG }
+    def run():
+        timings = []
+        start = time.time()
+        try:
+            if not os.path.isdir(directory):
+                result['status'] = REPORT_NOT_DIR
+                return
+            [ entries, invalid ] = scan_profile_dir(directory, timings)
+        except OSError:
+            result['status'] = REPORT_UNREADABLE
+            return
+        result['entries'] = len(entries)
+        result['invalid'] = invalid
+        result['scan_time'] = (time.time() - start) * MSEC_PER_SEC
+        result['timings'] = timings
+        result['status'] = REPORT_OK
+
+    worker = threading.Thread(target=run)
+    worker.daemon = True
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        return { 'status': REPORT_HUNG }
+    return result
+
+def print_probe(name, directory, result):
+    sys.stdout.write(REPORT_PROFILE % (name, directory))
+    sys.stdout.write(g(REPORT_STATUS) % g(result['status']))
+    if result['status'] != REPORT_OK:
+        return True
+    sys.stdout.write(g(REPORT_ENTRIES) % (result['entries'],
+            result['invalid']))
+    latencies = [ percentile(result['timings'], fraction) for fraction in
+            PERCENTILES ]
+    sys.stdout.write(g(REPORT_TIMES) % tuple([ result['scan_time'] ] +
+            latencies))
+    return latencies[-1] > SLOW_STAT_MSEC
+
+# report about the reachability and the scanning cost of every profile the
+# extension would look at. with quarantine set, the unhealthy profiles of
+# the user get flagged in the settings file and the healthy ones released
+def report_profiles(filename, quarantine):
+    file = Gio.file_new_for_path(filename)
+    [ values, _, err_str ] = read_json_file(file)
+    if (err_str == None) and (type(values).__name__ != 'dict'):
+        err_str = g(ERR_BAD_FORMAT) % filename
+    if err_str != None:
+        # never overwrite a file we couldn't understand
+        sys.stderr.write(err_str + '\n')
+        values = dict(DEFAULT_OPTIONS)
+        quarantine = False
+    profiles = values.get('profiles')
+    if type(profiles).__name__ != 'list':
+        profiles = []
+
+    # only the profiles listed in the user's settings can be quarantined:
+    # the default profile and the system-wide ones are just reported
+    if values.get('use-default-profile', True) is not False:
+        directory = GLib.build_filenamev(DEFAULT_PROFILE_PARTS)
+        print_probe(g(REPORT_DEFAULT_PROFILE), directory,
+                probe_profile(directory))
+
+    changed = False
+    for profile in profiles:
+        if not is_valid_profile(profile):
+            continue
+        unhealthy = print_probe(profile['name'], profile['directory'],
+                probe_profile(profile['directory']))
+        if not quarantine:
+            if unhealthy and not is_quarantined(profile):
+                sys.stdout.write(g(REPORT_SUGGESTION))
+        elif unhealthy and not is_quarantined(profile):
+            profile['quarantined'] = True
+            sys.stdout.write(g(REPORT_QUARANTINED))
+            changed = True
+        elif (not unhealthy) and is_quarantined(profile):
+            del profile['quarantined']
+            sys.stdout.write(g(REPORT_RELEASED))
+            changed = True
+
+    [ system, _, err_str ] = read_json_file(
+            Gio.file_new_for_path(SYSTEM_SETTINGS_PATH))
+    if (err_str == None) and (type(system).__name__ == 'dict') and \
+            (type(system.get('profiles')).__name__ == 'list'):
+        for profile in system['profiles']:
+            if is_valid_profile(profile):
+                print_probe(profile['name'], profile['directory'],
+                        probe_profile(profile['directory']))
+
+    if changed:
+        try:
+            GLib.file_set_contents(filename, str.encode(json.dumps(values)))
+        except GObject.GError as write_error:
+            sys.stderr.write((g(ERR_FILE_WRITE) % (filename, write_error)) +
+                    '\n')
+
+    report_launches()
+
+# summarize the launch latencies the extension has recorded, so that the
+# effect of reading ahead can be told
+def report_launches():
+    [ history, _, err_str ] = read_json_file(Gio.file_new_for_path(
+            GLib.build_filenamev(LAUNCH_HISTORY_PARTS)))
+    if (err_str != None) or (type(history).__name__ != 'dict') or \
+            (type(history.get('stats')).__name__ != 'dict'):
+        return
+
+    lines = ''
+    for [ kind, text ] in [ [ 'cold', REPORT_LAUNCH_COLD ],
+            [ 'prewarmed', REPORT_LAUNCH_PREWARMED ] ]:
+        try:
+            count = int(history['stats'][kind]['count'])
+            total = float(history['stats'][kind]['total'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if count > 0:
+            lines += g(REPORT_LAUNCH_STATS) % (g(text), count, total / count)
+    if lines != '':
+        sys.stdout.write(g(REPORT_LAUNCHES) + lines)
+
+# scan the system-wide profiles once for all the users. this is meant to be
+# run by the administrator whenever the shared applications change
+def build_system_index():
+    [ values, _, err_str ] = read_json_file(
+            Gio.file_new_for_path(SYSTEM_SETTINGS_PATH))
+    if (err_str == None) and (type(values).__name__ == 'dict'):
+        values = values.get('profiles')
+    if (err_str != None) or (type(values).__name__ != 'list'):
+        sys.stderr.write(g(ERR_INDEX_SETTINGS) % SYSTEM_SETTINGS_PATH)
+        return
+
+    index = { 'profiles': [] }
+    count = 0
+    for profile in values:
+        if not is_valid_profile(profile):
+            continue
+        try:
+            # take the time before scanning: if the directory changes in the
+            # meantime, the extension will just see the index as stale
+            mtime = int(os.stat(profile['directory']).st_mtime)
+            [ entries, _ ] = scan_profile_dir(profile['directory'],
+                    keep_hidden=True)
+        except OSError as e:
+            sys.stderr.write(g(ERR_INDEX_PROFILE) % (profile['directory'], e))
+            continue
+        index['profiles'].append({
+            'name': profile['name'],
+            'directory': profile['directory'],
+            'mtime': mtime,
+            'entries': entries
+        })
+        count += len([ entry for entry in entries if entry['visible'] ])
+
+    try:
+        index_dir = Gio.file_new_for_path(GLib.path_get_dirname(
+                SYSTEM_INDEX_PATH))
+        if not index_dir.query_exists(None):
+            index_dir.make_directory_with_parents(None)
+        GLib.file_set_contents(SYSTEM_INDEX_PATH,
+                str.encode(json.dumps(index)))
+    except GObject.GError as write_error:
+        sys.stderr.write((g(ERR_FILE_WRITE) % (SYSTEM_INDEX_PATH,
+                write_error)) + '\n')
+        return
+    sys.stdout.write(g(INDEX_WRITTEN) % (SYSTEM_INDEX_PATH,
+            len(index['profiles']), count))
+
 def main():
     ext_path = GLib.path_get_dirname(os.path.realpath(__file__))
 
@@ -875,6 +1646,21 @@ def main():
                 action = 'store',
                 dest = 'filename',
                 help=g(ERR_FILE_HELP)
+            ),
+            make_option('--build-system-index',
+                action = 'store_true',
+                dest = 'build_system_index',
+                help=g(ERR_INDEX_HELP)
+            ),
+            make_option('--report',
+                action = 'store_true',
+                dest = 'report',
+                help=g(ERR_REPORT_HELP)
+            ),
+            make_option('--quarantine',
+                action = 'store_true',
+                dest = 'quarantine',
+                help=g(ERR_QUARANTINE_HELP)
             )
         ])
     try:
@@ -883,12 +1669,22 @@ def main():
         sys.stderr.write("%s\n" % g(ERR_WRONG_ARGS))
         return
 
+    if parser.values.build_system_index:
+        build_system_index()
+        return
+
     if parser.values.filename == None:
         filename = GLib.build_filenamev(DEFAULT_OPTION_FILE_PARTS)
         sys.stderr.write(g(WARN_DEF_OPT_FILE) % filename)
     else:
         filename = parser.values.filename
 
+    if parser.values.report:
+        report_profiles(filename, parser.values.quarantine)
+        return
+
+    # the profile discovery runs in worker threads
+    GObject.threads_init()
     configurator = Configurator(filename)
     configurator.run(None)
 
@@ -0,0 +1,92 @@
+# Shared fixtures for the tests of the setup tool and the read-ahead helper.
+# Run them from the top source directory with:
+#
+#     python -m pytest tests
+#
+# The setup tool needs PyGObject and GTK+ 3: without them its tests are
+# skipped, unless WEBAPPMENU_REQUIRE_GI is set in the environment, in which
+# case they fail. The read-ahead helper only needs the standard library.
+
+import importlib
+import importlib.util
+import types
+import sys
+import os
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'src')
+
+# the profile directory described in HACKING, under "CHECKING THE SCAN RULES"
+DESKTOP_ENTRY = '[Desktop Entry]\nName=%s\nExec=true\nType=Application\n%s'
+REQUIRE_GI_VARIABLE = 'WEBAPPMENU_REQUIRE_GI'
+FIXTURE_ENTRIES = [
+    [ 'hidden-3', 'Hidden=true\n' ],
+    [ 'kde-4', 'NotShowIn=GNOME;\n' ],
+    [ 'nolink-5', '' ],
+    [ 'badlink-6', '' ],
+    [ 'good-7', '' ]
+]
+
+def missing_dependency(reason):
+    if os.environ.get(REQUIRE_GI_VARIABLE):
+        pytest.fail('%s, while %s is set' % (reason, REQUIRE_GI_VARIABLE))
+    pytest.skip(reason)
+
+def load_source(module_name, filename):
+    spec = importlib.util.spec_from_file_location(module_name,
+            os.path.join(SRC_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def write_entry(profile, name, extra=''):
+    app_dir = profile / ('app-epiphany-' + name)
+    app_dir.mkdir(parents=True)
+    entry = app_dir / ('epiphany-' + name + '.desktop')
+    entry.write_text(DESKTOP_ENTRY % (name, extra))
+    return entry
+
+@pytest.fixture(scope='session')
+def setup_tool():
+    try:
+        gi = importlib.import_module('gi')
+    except ImportError:
+        missing_dependency('PyGObject is not available')
+    try:
+        gi.require_version('Gtk', '3.0')
+        importlib.import_module('gi.repository.Gtk')
+    except (ValueError, ImportError):
+        missing_dependency('GTK+ 3 is not available')
+    from gi.repository import GLib
+
+    # the static glib bindings are gone from recent PyGObject releases, which
+    # even register an empty module in their place, but the option parser
+    # they provided is still there
+    try:
+        from glib import option
+    except ImportError:
+        glib = types.ModuleType('glib')
+        glib.option = GLib.option
+        sys.modules['glib'] = glib
+        sys.modules['glib.option'] = GLib.option
+    return load_source('webappmenu_setup', 'webappmenu-setup.py')
+
+@pytest.fixture(scope='session')
+def readahead_tool():
+    return load_source('webappmenu_readahead', 'webappmenu-readahead.py')
+
+@pytest.fixture
+def profile_tree(tmp_path):
+    profile = tmp_path / 'profile'
+    (profile / 'not-an-app').mkdir(parents=True)
+    (profile / 'app-epiphany-file-1').write_text('')
+    (profile / 'app-epiphany-nodesktop-2').mkdir()
+    for name, extra in FIXTURE_ENTRIES:
+        write_entry(profile, name, extra)
+    return profile
+
+@pytest.fixture
+def entry_writer():
+    return write_entry
@@ -0,0 +1,242 @@
+/* -*- mode: js2 - indent-tabs-mode: nil - js2-basic-offset: 4 -*- */
+/*
+ * Test harness for the profile scanner. Run it from the top source directory
+ * with:
+ *
+ *     gjs tests/testScan.js
+ *
+ * It builds the profile directory described in HACKING, under "CHECKING THE
+ * SCAN RULES", in a temporary directory and checks which entries the
+ * extension would show out of it, links in the user's applications directory
+ * included.
+ */
+
+const Gio = imports.gi.Gio;
+const GLib = imports.gi.GLib;
+
+/* the Shell provides this one */
+String.prototype.format = imports.format.format;
+
+imports.searchPath.unshift(GLib.build_filenamev([ GLib.get_current_dir(),
+        'src' ]));
+const Scan = imports.webappScan;
+
+const TMP_TEMPLATE  = 'webappmenu-test-XXXXXX';
+const DIR_PERMS     = 0x1ed; /* 0755 */
+const LOOP_TIMEOUT  = 5000;
+const SETTLE_DELAY  = 200;
+const GENERATION    = 1;
+const DESKTOP_ENTRY = '[Desktop Entry]\nName=%s\nExec=true\n' +
+        'Type=Application\n%s';
+const FIXTURE_ENTRIES = [
+    [ 'hidden-3', 'Hidden=true\n' ],
+    [ 'kde-4', 'NotShowIn=GNOME;\n' ],
+    [ 'nolink-5', '' ],
+    [ 'badlink-6', '' ],
+    [ 'good-7', '' ]
+];
+
+let failures = 0;
+
+function assert(condition, message) {
+    if (!condition) {
+        throw new Error(message);
+    }
+}
+
+function run_test(name, test) {
+    try {
+        test();
+        print('PASS: ' + name);
+    } catch (e) {
+        print('FAIL: ' + name + ': ' + e.message);
+        failures++;
+    }
+}
+
+/* run the main loop until the test calls quit() on it, failing if that
+ * doesn't happen in time */
+function run_loop(start) {
+    let loop = new GLib.MainLoop(null, false);
+    let timed_out = false;
+    let timeout_id = GLib.timeout_add(GLib.PRIORITY_DEFAULT, LOOP_TIMEOUT,
+            function() {
+                timed_out = true;
+                loop.quit();
+                return false;
+            });
+
+    start(loop);
+    loop.run();
+    if (!timed_out) {
+        GLib.source_remove(timeout_id);
+    }
+    assert(!timed_out, "the main loop timed out");
+}
+
+function remove_tree(path) {
+    let file = Gio.file_new_for_path(path);
+
+    if (file.query_file_type(Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS,
+            null) == Gio.FileType.DIRECTORY) {
+        let children = file.enumerate_children('standard::name',
+                Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS, null);
+        let info;
+
+        while ((info = children.next_file(null)) != null) {
+            remove_tree(GLib.build_filenamev([ path, info.get_name() ]));
+        }
+        children.close(null);
+    }
+    file.delete(null);
+}
+
+function entry_path(profile, name) {
+    return GLib.build_filenamev([ profile, 'app-epiphany-' + name,
+            'epiphany-' + name + '.desktop' ]);
+}
+
+function link_path(xdg_dir, name) {
+    return GLib.build_filenamev([ xdg_dir, 'epiphany-' + name + '.desktop' ]);
+}
+
+/* build the profile directory along with a user's applications directory
+ * holding the links for good-7 and badlink-6 only, the latter pointing
+ * somewhere else */
+function make_tree() {
+    let root = GLib.dir_make_tmp(TMP_TEMPLATE);
+    let profile = GLib.build_filenamev([ root, 'profile' ]);
+    let xdg_dir = GLib.build_filenamev([ root, 'applications' ]);
+
+    GLib.mkdir_with_parents(GLib.build_filenamev([ profile, 'not-an-app' ]),
+            DIR_PERMS);
+    GLib.mkdir_with_parents(GLib.build_filenamev([ profile,
+            'app-epiphany-nodesktop-2' ]), DIR_PERMS);
+    GLib.mkdir_with_parents(xdg_dir, DIR_PERMS);
+    GLib.file_set_contents(GLib.build_filenamev([ profile,
+            'app-epiphany-file-1' ]), '');
+
+    for each (let [ name, extra ] in FIXTURE_ENTRIES) {
+        let path = entry_path(profile, name);
+
+        GLib.mkdir_with_parents(GLib.path_get_dirname(path), DIR_PERMS);
+        GLib.file_set_contents(path, DESKTOP_ENTRY.format(name, extra));
+    }
+
+    Gio.file_new_for_path(link_path(xdg_dir, 'good-7')).make_symbolic_link(
+            entry_path(profile, 'good-7'), null);
+    Gio.file_new_for_path(link_path(xdg_dir, 'badlink-6')).make_symbolic_link(
+            entry_path(root, 'badlink-6'), null);
+
+    return { root: root, profile: profile, xdg_dir: xdg_dir };
+}
+
+/* run a test against a fresh tree and an empty entry cache */
+function with_tree(test) {
+    return function() {
+        let tree = make_tree();
+
+        Scan.clear_entry_cache();
+        try {
+            test(tree);
+        } finally {
+            remove_tree(tree.root);
+        }
+    };
+}
+
+/* scan a profile directory, returning the sorted names of the entries shown
+ * and whether the directory could be read */
+function scan(profile, xdg_dir) {
+    let names = [];
+    let success = null;
+
+    run_loop(function(loop) {
+        Scan.scan_directory(profile, xdg_dir, GENERATION,
+                new Gio.Cancellable(), function(path, entry) {
+                    names.push(entry['name']);
+                }, function(result) {
+                    success = result;
+                    loop.quit();
+                });
+    });
+    names.sort();
+    return { names: names, success: success };
+}
+
+function check_link(tree, name) {
+    let linked = null;
+
+    run_loop(function(loop) {
+        Scan.check_xdg_link(entry_path(tree.profile, name), tree.xdg_dir,
+                new Gio.Cancellable(), function(result) {
+                    linked = result;
+                    loop.quit();
+                });
+    });
+    return linked;
+}
+
+run_test('only linked entries are shown when links are checked',
+        with_tree(function(tree) {
+    let result = scan(tree.profile, tree.xdg_dir);
+
+    assert(result.success, "the profile couldn't be read");
+    assert(result.names.join() == 'good-7', "%s shown".format(
+            result.names.join()));
+}));
+
+run_test('links are ignored when they are not checked',
+        with_tree(function(tree) {
+    let result = scan(tree.profile, null);
+
+    assert(result.success, "the profile couldn't be read");
+    assert(result.names.join() == 'badlink-6,good-7,nolink-5',
+            "%s shown".format(result.names.join()));
+}));
+
+run_test('an entry needs a link pointing to it', with_tree(function(tree) {
+    assert(check_link(tree, 'good-7') === true, "good link rejected");
+    assert(check_link(tree, 'nolink-5') === false, "missing link accepted");
+    assert(check_link(tree, 'badlink-6') === false,
+            "link pointing elsewhere accepted");
+}));
+
+run_test('a copy of the entry is not a link', with_tree(function(tree) {
+    let copy = Gio.file_new_for_path(link_path(tree.xdg_dir, 'nolink-5'));
+
+    Gio.file_new_for_path(entry_path(tree.profile, 'nolink-5')).copy(copy,
+            Gio.FileCopyFlags.NONE, null, null);
+    assert(check_link(tree, 'nolink-5') === false, "copy accepted");
+}));
+
+run_test('a missing profile is reported', with_tree(function(tree) {
+    let result = scan(GLib.build_filenamev([ tree.root, 'missing' ]), null);
+
+    assert(result.success === false, "the missing profile was read");
+    assert(result.names.length == 0, "%s shown".format(result.names.join()));
+}));
+
+run_test('a cancelled scan stays quiet', with_tree(function(tree) {
+    let cancellable = new Gio.Cancellable();
+    let calls = 0;
+
+    run_loop(function(loop) {
+        Scan.scan_directory(tree.profile, null, GENERATION, cancellable,
+                function() {
+                    calls++;
+                }, function() {
+                    calls++;
+                });
+        cancellable.cancel();
+        GLib.timeout_add(GLib.PRIORITY_DEFAULT, SETTLE_DELAY, function() {
+            loop.quit();
+            return false;
+        });
+    });
+    assert(calls == 0, "%d callbacks after cancelling".format(calls));
+}));
+
+if (failures) {
+    throw new Error("%d tests failed".format(failures));
+}
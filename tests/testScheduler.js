@@ -0,0 +1,268 @@
+/* -*- mode: js2 - indent-tabs-mode: nil - js2-basic-offset: 4 -*- */
+/*
+ * Test harness for the menu rebuild scheduler. Run it from the top source
+ * directory with:
+ *
+ *     gjs tests/testScheduler.js
+ *
+ * The main loop is faked, so that every slice of a rebuild is run by hand and
+ * the number of scans can be counted.
+ */
+
+const GLib = imports.gi.GLib;
+const Lang = imports.lang;
+
+/* the Shell provides this one */
+String.prototype.format = imports.format.format;
+
+imports.searchPath.unshift(GLib.build_filenamev([ GLib.get_current_dir(),
+        'src' ]));
+const Scheduler = imports.webappScheduler;
+
+const BURST_SIZE    = 100;
+const SCAN_SLICES   = 10;
+const TRIGGER_GAP   = 3;
+const MAX_ITERATIONS = 10000;
+
+function FakeMainloop() {
+    this._init.apply(this, arguments);
+}
+
+/* idle sources only: each iteration dispatches the sources which were there
+ * when it began */
+FakeMainloop.prototype = {
+    _init: function() {
+        this._sources = {};
+        this._last_id = 0;
+    },
+
+    idle_add: function(callback) {
+        this._sources[++this._last_id] = callback;
+        return this._last_id;
+    },
+
+    source_remove: function(id) {
+        delete this._sources[id];
+    },
+
+    pending: function() {
+        return Object.keys(this._sources).length;
+    },
+
+    iterate: function() {
+        let ids = Object.keys(this._sources);
+
+        for (let i = 0; i < ids.length; i++) {
+            let callback = this._sources[ids[i]];
+
+            /* removed by an earlier source of this iteration */
+            if (callback == undefined) {
+                continue;
+            }
+
+            if (!callback()) {
+                delete this._sources[ids[i]];
+            }
+        }
+    },
+
+    run: function() {
+        for (let i = 0; (i < MAX_ITERATIONS) && (this.pending()); i++) {
+            this.iterate();
+        }
+        assert(!this.pending(), "the main loop never went idle");
+    }
+};
+
+/* a fake menu: every rebuild is a scan taking a few slices, whose result is
+ * only committed by its last task */
+function FakeMenu() {
+    this._init.apply(this, arguments);
+}
+
+FakeMenu.prototype = {
+    _init: function(mainloop) {
+        this.scans = 0;
+        this.slices = {};
+        this.committed = [];
+        this.scheduler = new Scheduler.RebuildScheduler(mainloop,
+                Lang.bind(this, this._build_tasks));
+    },
+
+    _build_tasks: function(generation, cancellable) {
+        let slices = 0;
+
+        this.scans++;
+        this.slices[generation] = 0;
+        return [
+            Lang.bind(this, function() {
+                this.slices[generation]++;
+                return ((++slices < SCAN_SLICES)?Scheduler.TASK_AGAIN:
+                        Scheduler.TASK_DONE);
+            }),
+            Lang.bind(this, function() {
+                this.committed.push(generation);
+                return Scheduler.TASK_DONE;
+            })
+        ];
+    }
+};
+
+let failures = 0;
+
+function assert(condition, message) {
+    if (!condition) {
+        throw new Error(message);
+    }
+}
+
+function run_test(name, test) {
+    try {
+        test();
+        print('PASS: ' + name);
+    } catch (e) {
+        print('FAIL: ' + name + ': ' + e.message);
+        failures++;
+    }
+}
+
+run_test('a burst of triggers costs a single scan', function() {
+    let mainloop = new FakeMainloop();
+    let menu = new FakeMenu(mainloop);
+
+    for (let i = 0; i < BURST_SIZE; i++) {
+        menu.scheduler.queue();
+    }
+    mainloop.run();
+
+    assert(menu.scans == 1, "%d scans instead of 1".format(menu.scans));
+    assert(menu.committed.length == 1, "result committed %d times".format(
+            menu.committed.length));
+});
+
+run_test('triggers during a scan queue just one more', function() {
+    let mainloop = new FakeMainloop();
+    let menu = new FakeMenu(mainloop);
+
+    menu.scheduler.queue();
+    /* start the scan and run a couple of its slices */
+    mainloop.iterate();
+    mainloop.iterate();
+    mainloop.iterate();
+    assert(menu.scheduler.is_busy(), "the scan is already over");
+
+    for (let i = 0; i < BURST_SIZE; i++) {
+        menu.scheduler.queue();
+    }
+    assert(mainloop.pending() == 2, "%d sources pending".format(
+            mainloop.pending()));
+    mainloop.run();
+
+    assert(menu.scans == 2, "%d scans instead of 2".format(menu.scans));
+    assert(menu.slices[1] < SCAN_SLICES, "the stale scan went on");
+    assert(menu.slices[2] == SCAN_SLICES, "the new scan didn't complete");
+    assert((menu.committed.length == 1) && (menu.committed[0] == 2),
+            "stale results were committed");
+});
+
+run_test('scans stay bounded under continuous triggers', function() {
+    let mainloop = new FakeMainloop();
+    let menu = new FakeMenu(mainloop);
+    let iterations = SCAN_SLICES * 3;
+    let bursts = 0;
+    let slices = 0;
+
+    /* bursts keep coming faster than a scan can complete */
+    for (let i = 0; i < iterations; i++) {
+        if (!(i % TRIGGER_GAP)) {
+            for (let j = 0; j < BURST_SIZE; j++) {
+                menu.scheduler.queue();
+            }
+            bursts++;
+        }
+        mainloop.iterate();
+        assert(mainloop.pending() <= 2, "%d sources pending".format(
+                mainloop.pending()));
+    }
+    mainloop.run();
+
+    /* exactly one scan per burst, whatever its size */
+    assert(menu.scans == bursts, "%d scans for %d bursts".format(menu.scans,
+            bursts));
+
+    /* every stale scan is stopped by the next burst, so the work done is
+     * bounded by the time between bursts, plus one complete scan */
+    for (let generation in menu.slices) {
+        slices += menu.slices[generation];
+    }
+    assert(slices <= (bursts - 1) * TRIGGER_GAP + SCAN_SLICES,
+            "%d slices run for %d bursts".format(slices, bursts));
+    assert((menu.committed.length == 1) &&
+            (menu.committed[0] == menu.scheduler.generation),
+            "stale results were committed");
+});
+
+run_test('cancelling releases what the scan holds', function() {
+    let mainloop = new FakeMainloop();
+    let resume = null;
+    let closed = 0;
+    let cancellables = [];
+    let scheduler = new Scheduler.RebuildScheduler(mainloop,
+            function(generation, cancellable) {
+        cancellables.push(cancellable);
+        return [ function() {
+            if (resume != null) {
+                return Scheduler.TASK_DONE;
+            }
+            /* pretend to open a directory asynchronously */
+            scheduler.add_cleanup(function() {
+                closed++;
+            });
+            resume = function() {
+                scheduler.resume(generation);
+            };
+            return Scheduler.TASK_WAIT;
+        } ];
+    });
+
+    scheduler.queue();
+    mainloop.run();
+    assert(resume != null, "the task didn't start");
+    assert(scheduler.is_busy(), "the waiting scan isn't accounted");
+
+    /* a new trigger cancels the waiting scan */
+    let stale_resume = resume;
+    resume = null;
+    scheduler.queue();
+    mainloop.iterate();
+    assert(cancellables[0].is_cancelled(), "the stale scan isn't cancelled");
+    assert(closed == 1, "the stale scan wasn't cleaned up");
+
+    /* a late completion of the stale scan changes nothing */
+    stale_resume();
+    assert(mainloop.pending() == 1, "the stale scan was resumed");
+
+    mainloop.run();
+    resume();
+    mainloop.run();
+    assert(!scheduler.is_busy(), "the scan never completed");
+    assert(!(cancellables[1].is_cancelled()), "the new scan was cancelled");
+    assert(closed == 1, "completed scans shouldn't be cleaned up");
+});
+
+run_test('destroying leaves no sources behind', function() {
+    let mainloop = new FakeMainloop();
+    let menu = new FakeMenu(mainloop);
+
+    menu.scheduler.queue();
+    mainloop.iterate();
+    menu.scheduler.queue();
+    menu.scheduler.destroy();
+
+    assert(mainloop.pending() == 0, "%d sources left".format(
+            mainloop.pending()));
+});
+
+if (failures) {
+    throw new Error("%d tests failed".format(failures));
+}
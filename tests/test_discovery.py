@@ -0,0 +1,105 @@
+# profile discovery from the configurator
+
+import os
+
+import pytest
+
+DISCOVERY_TIMEOUT_SEC = 10
+
+def discover(setup_tool, root, **kwargs):
+    from gi.repository import GLib
+
+    loop = GLib.MainLoop()
+    found = []
+    result = { 'done': False }
+
+    def on_found(path):
+        found.append(path)
+
+    def on_done():
+        result['done'] = True
+        loop.quit()
+
+    def on_timeout():
+        loop.quit()
+        return False
+
+    finder = setup_tool.ProfileFinder(str(root), on_found, on_done, **kwargs)
+    finder.start()
+    timeout_id = GLib.timeout_add_seconds(DISCOVERY_TIMEOUT_SEC, on_timeout)
+    loop.run()
+    if result['done']:
+        GLib.source_remove(timeout_id)
+
+    assert result['done'], 'discovery never completed'
+    return [ finder, sorted(found) ]
+
+def make_profile(entry_writer, directory):
+    entry_writer(directory, 'site-1')
+    return directory
+
+def test_discovery(setup_tool, tmp_path, entry_writer):
+    alice = make_profile(entry_writer,
+            tmp_path / 'alice' / '.gnome2' / 'epiphany')
+    bob = make_profile(entry_writer, tmp_path / 'bob' / '.gnome2' / 'epiphany')
+    (tmp_path / 'empty' / 'deeper').mkdir(parents=True)
+
+    [ finder, found ] = discover(setup_tool, tmp_path)
+
+    assert found == sorted([ str(alice), str(bob) ])
+    assert finder.found == 2
+
+def test_discovery_symlink_loop(setup_tool, tmp_path, entry_writer):
+    profile = make_profile(entry_writer, tmp_path / 'a' / 'profile')
+    os.symlink(str(tmp_path), str(tmp_path / 'a' / 'loop'))
+    os.symlink(str(tmp_path / 'a'), str(tmp_path / 'a' / 'again'))
+
+    [ finder, found ] = discover(setup_tool, tmp_path)
+
+    assert found == [ str(profile) ]
+    # every directory is scanned once, whatever the number of paths to it
+    assert finder.scanned == 3
+
+def test_discovery_max_depth(setup_tool, tmp_path, entry_writer):
+    make_profile(entry_writer, tmp_path / 'one' / 'two' / 'three')
+
+    [ _, found ] = discover(setup_tool, tmp_path, max_depth=2)
+
+    assert found == []
+
+def test_discovery_missing_root(setup_tool, tmp_path):
+    [ finder, found ] = discover(setup_tool, tmp_path / 'missing')
+
+    assert found == []
+    assert finder.scanned == 0
+
+def test_discovery_survives_errors(setup_tool, tmp_path, entry_writer,
+        monkeypatch):
+    profile = make_profile(entry_writer, tmp_path / 'good' / 'profile')
+    (tmp_path / 'broken').mkdir()
+    real_listdir = os.listdir
+
+    def failing_listdir(path):
+        if os.path.basename(str(path)) == 'broken':
+            raise RuntimeError('unexpected failure')
+        return real_listdir(path)
+
+    monkeypatch.setattr(os, 'listdir', failing_listdir)
+    [ _, found ] = discover(setup_tool, tmp_path, threads=1)
+
+    assert found == [ str(profile) ]
+
+def test_discovered_names(setup_tool):
+    taken = set()
+    root = '/home'
+
+    assert setup_tool.discovered_profile_name(root,
+            '/home/alice/.gnome2/epiphany', taken) == 'alice'
+    assert setup_tool.discovered_profile_name(root,
+            '/home/bob/.gnome2/epiphany', taken) == 'bob'
+    assert setup_tool.discovered_profile_name(root,
+            '/home/bob/work', taken) == os.path.join('bob', 'work')
+    assert setup_tool.discovered_profile_name(root,
+            '/home/alice', taken) == setup_tool.DISCOVERED_NAME % ('alice', 2)
+    assert setup_tool.discovered_profile_name('/home/carol',
+            '/home/carol/.gnome2/epiphany', taken) == 'carol'
@@ -0,0 +1,100 @@
+# repairs applied by the configurator to damaged settings files
+
+import copy
+
+def valid_options(setup_tool):
+    values = copy.deepcopy(setup_tool.DEFAULT_OPTIONS)
+    values['profiles'] = [ { 'name': 'work', 'directory': '/srv/work' } ]
+    return values
+
+def bad_row(setup_tool, row):
+    return (setup_tool.ERR_BAD_PROFILE % row).strip()
+
+def test_valid_options(setup_tool):
+    values = valid_options(setup_tool)
+    [ checked, changed, error_text ] = setup_tool.check_options(
+            copy.deepcopy(values), None)
+
+    assert checked == values
+    assert not changed
+    assert error_text == ''
+
+def test_unreadable_file(setup_tool):
+    [ checked, changed, error_text ] = setup_tool.check_options(None,
+            'cannot read')
+
+    assert checked == setup_tool.DEFAULT_OPTIONS
+    assert changed
+    assert error_text.startswith('cannot read')
+
+def test_key_repairs(setup_tool):
+    values = valid_options(setup_tool)
+    values['icon-size'] = 'big'
+    values['show-icons'] = 1
+    del values['split-profile-view']
+    [ checked, changed, error_text ] = setup_tool.check_options(values, None)
+
+    assert changed
+    for key in [ 'icon-size', 'show-icons', 'split-profile-view' ]:
+        assert checked[key] == setup_tool.DEFAULT_OPTIONS[key]
+        assert key in error_text.splitlines()
+    assert 'use-default-profile' not in error_text
+
+def test_missing_optional_keys(setup_tool):
+    values = valid_options(setup_tool)
+    for key in setup_tool.OPTIONAL_OPTIONS:
+        del values[key]
+    [ checked, changed, error_text ] = setup_tool.check_options(values, None)
+
+    assert not changed
+    assert error_text == ''
+    for key in setup_tool.OPTIONAL_OPTIONS:
+        assert checked[key] == setup_tool.DEFAULT_OPTIONS[key]
+
+def test_wrong_optional_key(setup_tool):
+    values = valid_options(setup_tool)
+    values['shard-threshold'] = '50'
+    [ checked, changed, error_text ] = setup_tool.check_options(values, None)
+
+    assert changed
+    assert checked['shard-threshold'] == \
+            setup_tool.DEFAULT_OPTIONS['shard-threshold']
+    assert 'shard-threshold' in error_text
+    assert 'prewarm-count' not in error_text
+
+def test_row_repairs(setup_tool):
+    values = valid_options(setup_tool)
+    good = values['profiles'][0]
+    values['profiles'] = [ 'junk', good, { 'name': 'no directory' },
+            { 'name': 1, 'directory': '/srv' } ]
+    [ checked, changed, error_text ] = setup_tool.check_options(values, None)
+
+    assert changed
+    assert checked['profiles'] == [ good ]
+    for row in [ 1, 3, 4 ]:
+        assert bad_row(setup_tool, row) in error_text.splitlines()
+    assert bad_row(setup_tool, 2) not in error_text.splitlines()
+
+def test_rows_summary_cut_off(setup_tool):
+    extra = 3
+    values = valid_options(setup_tool)
+    values['profiles'] = [ None ] * (setup_tool.SUMMARY_MAX_ROWS + extra)
+    [ checked, changed, error_text ] = setup_tool.check_options(values, None)
+
+    assert changed
+    assert checked['profiles'] == []
+    rows = error_text.splitlines()
+    assert bad_row(setup_tool, setup_tool.SUMMARY_MAX_ROWS) in rows
+    assert bad_row(setup_tool, setup_tool.SUMMARY_MAX_ROWS + 1) not in rows
+    assert (setup_tool.ERR_MORE_PROFILES % extra).strip() in rows
+
+def test_deeply_nested_file(setup_tool, tmp_path):
+    from gi.repository import Gio
+
+    path = tmp_path / 'settings.json'
+    path.write_text('[' * 100000 + ']' * 100000)
+    [ values, error_title, error_text ] = setup_tool.read_json_file(
+            Gio.File.new_for_path(str(path)))
+
+    assert values is None
+    assert error_text == setup_tool.ERR_BAD_FORMAT % str(path)
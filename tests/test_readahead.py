@@ -0,0 +1,89 @@
+# the read-ahead helper spawned by the extension when its menu opens
+
+import sys
+import os
+
+def count_opens(monkeypatch):
+    opened = []
+    real_open = os.open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'open', counting_open)
+    return opened
+
+def test_files_and_directories(readahead_tool, tmp_path, monkeypatch):
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'app' / 'a.desktop').write_text('a')
+    (tmp_path / 'app' / 'b.png').write_text('b')
+    (tmp_path / 'app' / 'nested').mkdir()
+    (tmp_path / 'app' / 'nested' / 'c').write_text('c')
+    (tmp_path / 'single').write_text('d')
+    opened = count_opens(monkeypatch)
+
+    readahead_tool.read_ahead([ str(tmp_path / 'app'),
+            str(tmp_path / 'single') ])
+
+    # directories aren't walked recursively
+    assert sorted(opened) == sorted([ str(tmp_path / 'app' / 'a.desktop'),
+            str(tmp_path / 'app' / 'b.png'), str(tmp_path / 'single') ])
+
+def test_missing_paths(readahead_tool, tmp_path, monkeypatch):
+    opened = count_opens(monkeypatch)
+
+    readahead_tool.read_ahead([ str(tmp_path / 'missing'), '' ])
+
+    assert opened == []
+
+def test_unreadable_file(readahead_tool, tmp_path, monkeypatch):
+    readable = tmp_path / 'readable'
+    readable.write_text('a')
+
+    def failing_open(path, *args, **kwargs):
+        raise OSError('denied')
+
+    monkeypatch.setattr(os, 'open', failing_open)
+    readahead_tool.read_ahead([ str(readable) ])
+
+def test_hints_without_reading(readahead_tool, tmp_path, monkeypatch):
+    data = tmp_path / 'data'
+    data.write_text('a' * 4096)
+    advised = []
+
+    def failing_read(*args, **kwargs):
+        raise AssertionError('files must not be read')
+
+    monkeypatch.setattr(os, 'read', failing_read)
+    readahead_tool.read_ahead([ str(data) ], advised.append)
+
+    assert len(advised) == 1
+
+def test_hints_without_posix_fadvise(readahead_tool, tmp_path, monkeypatch):
+    data = tmp_path / 'data'
+    data.write_text('a')
+    monkeypatch.delattr(os, 'posix_fadvise', raising=False)
+
+    advise = readahead_tool.get_advise()
+    if not sys.platform.startswith('linux'):
+        assert advise is None
+        return
+
+    # the C library is called straight away
+    assert advise is not None
+    fd = os.open(str(data), os.O_RDONLY)
+    try:
+        assert advise(fd) == 0
+    finally:
+        os.close(fd)
+
+def test_nothing_opened_without_hints(readahead_tool, tmp_path, monkeypatch):
+    data = tmp_path / 'data'
+    data.write_text('a')
+    monkeypatch.setattr(readahead_tool, 'get_advise', lambda: None)
+    opened = count_opens(monkeypatch)
+
+    readahead_tool.read_ahead([ str(data) ])
+
+    assert opened == []
@@ -0,0 +1,91 @@
+# the rules the setup tool follows when listing the entries of a profile, and
+# what listing them costs
+
+import os
+import time
+
+import pytest
+
+SHOWN = [ 'badlink-6', 'good-7', 'nolink-5' ]
+HIDDEN = [ 'hidden-3', 'kde-4' ]
+# every app-epiphany-* element is stat()ed, and so is the desktop file of
+# each application directory
+PREFIXED_ELEMENTS = 7
+APP_DIRS = 6
+# a generous floor, so that only a real regression trips it
+SPEED_ENTRIES = 500
+SPEED_MIN_ENTRIES_PER_SEC = 1000.0
+
+def entry_names(entries):
+    return sorted(entry['names']['Name'] for entry in entries)
+
+def test_scan_rules(setup_tool, profile_tree):
+    [ entries, invalid ] = setup_tool.scan_profile_dir(str(profile_tree))
+
+    # links to the user's applications directory are only checked by the
+    # extension, at runtime
+    assert len(entries) == 3
+    assert entry_names(entries) == SHOWN
+    assert invalid == 1
+
+def test_scan_keeps_hidden(setup_tool, profile_tree):
+    [ entries, invalid ] = setup_tool.scan_profile_dir(str(profile_tree),
+            keep_hidden=True)
+
+    assert entry_names(entries) == sorted(SHOWN + HIDDEN)
+    assert invalid == 1
+    for entry in entries:
+        assert entry['visible'] == (entry['names']['Name'] in SHOWN)
+        assert entry['mtime'] == int(os.stat(entry['path']).st_mtime)
+
+def test_scan_timings(setup_tool, profile_tree):
+    timings = []
+    setup_tool.scan_profile_dir(str(profile_tree), timings)
+
+    assert len(timings) == PREFIXED_ELEMENTS
+    assert all(timing >= 0.0 for timing in timings)
+
+def test_scan_system_calls(setup_tool, profile_tree, monkeypatch):
+    calls = { 'stat': 0, 'listdir': 0 }
+    real_stat = os.stat
+    real_listdir = os.listdir
+
+    def counting_stat(*args, **kwargs):
+        calls['stat'] += 1
+        return real_stat(*args, **kwargs)
+
+    def counting_listdir(*args, **kwargs):
+        calls['listdir'] += 1
+        return real_listdir(*args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', counting_stat)
+    monkeypatch.setattr(os, 'listdir', counting_listdir)
+    setup_tool.scan_profile_dir(str(profile_tree))
+
+    assert calls['listdir'] == 1
+    assert calls['stat'] == PREFIXED_ELEMENTS + APP_DIRS
+
+def test_scan_speed(setup_tool, tmp_path, entry_writer):
+    for i in range(SPEED_ENTRIES):
+        entry_writer(tmp_path, 'app%d-%d' % (i, i))
+
+    start = time.time()
+    [ entries, _ ] = setup_tool.scan_profile_dir(str(tmp_path))
+    elapsed = time.time() - start
+
+    assert len(entries) == SPEED_ENTRIES
+    assert SPEED_ENTRIES / max(elapsed, 1e-6) >= SPEED_MIN_ENTRIES_PER_SEC
+
+def test_scan_missing_directory(setup_tool, tmp_path):
+    with pytest.raises(OSError):
+        setup_tool.scan_profile_dir(str(tmp_path / 'missing'))
+
+@pytest.mark.parametrize('fraction, expected', [
+    [ 0.0, 1 ], [ 0.5, 6 ], [ 0.9, 10 ], [ 0.99, 10 ], [ 1.0, 10 ]
+])
+def test_percentile(setup_tool, fraction, expected):
+    values = [ 10, 9, 8, 7, 6, 5, 4, 3, 2, 1 ]
+    assert setup_tool.percentile(values, fraction) == expected
+
+def test_percentile_empty(setup_tool):
+    assert setup_tool.percentile([], 0.5) == 0.0